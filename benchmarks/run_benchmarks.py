@@ -0,0 +1,237 @@
+"""
+Stage benchmarks for blender_wormholes on synthetic scenes.
+
+Run under background Blender or with the bpy wheel:
+
+    blender -b --python benchmarks/run_benchmarks.py -- --out results.json
+    python benchmarks/run_benchmarks.py --out results.json --baseline baseline.json
+
+Every stage is timed separately (median of --repeat runs) and written to
+JSON. With --baseline, stages slower than --threshold times the baseline
+are reported and the script exits with status 1.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+
+import bpy
+import bmesh
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import blender_wormholes as bl
+
+
+SUBDIVISIONS = (2, 4, 6)
+N_MATERIALS = (1, 16, 64)
+RESOLUTIONS = ((64, 64), (256, 256), (1024, 1024))
+RENDER_SAMPLES = 4
+
+
+def timeit(fn, repeat, setup=None, teardown=None):
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        result = fn(state) if setup is not None else fn()
+        times.append(time.perf_counter() - start)
+        if teardown is not None:
+            teardown(result)
+    return statistics.median(times)
+
+
+def reset_scene():
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    scene.render.engine = 'CYCLES'
+    scene.cycles.device = 'CPU'
+    scene.cycles.samples = RENDER_SAMPLES
+    scene.cycles.use_denoising = False
+    scene.cycles.use_adaptive_sampling = False
+    scene.cycles.max_bounces = 2
+    return scene
+
+
+def icosphere_data(subdivisions):
+    bm = bmesh.new()
+    bmesh.ops.create_icosphere(bm, subdivisions=subdivisions, radius=1.0)
+    vertices = np.array([v.co[:] for v in bm.verts], dtype=np.float32)
+    faces = np.array([[v.index for v in f.verts] for f in bm.faces])
+    bm.free()
+    return vertices, faces
+
+
+def write_obj(path, vertices, faces):
+    # OBJ is Y up; undo the Z up conversion the loaders apply
+    x, y, z = vertices.T
+    with open(path, 'w') as f:
+        np.savetxt(f, np.stack((x, z, -y), axis=1), fmt='v %.6f %.6f %.6f')
+        np.savetxt(f, faces + 1, fmt='f %d %d %d')
+
+
+def bench_import(results, tmp_dir, repeat):
+    cache_dir = os.path.join(tmp_dir, 'mesh_cache')
+    for subdivisions in SUBDIVISIONS:
+        reset_scene()
+        sc = bl.core.Scene()
+        path = os.path.join(tmp_dir, f'ico{subdivisions}.obj')
+        write_obj(path, *icosphere_data(subdivisions))
+
+        def delete(obj):
+            sc.delete_objects(obj.name)
+
+        results[f'import/native/ico{subdivisions}'] = timeit(
+            lambda: sc.add_objects(path), repeat, teardown=delete)
+        delete(sc.add_objects(path, cache_dir=cache_dir))
+        results[f'import/native_cached/ico{subdivisions}'] = timeit(
+            lambda: sc.add_objects(path, cache_dir=cache_dir), repeat,
+            teardown=delete)
+        # bpy.ops attribute lookups always succeed, so check the operator
+        # type; the legacy OBJ importer is gone in newer Blender versions
+        if hasattr(bpy.types, 'IMPORT_SCENE_OT_obj'):
+            results[f'import/operator/ico{subdivisions}'] = timeit(
+                lambda: sc.add_objects(path, loader='operator'), repeat,
+                teardown=delete)
+
+
+def bench_shading(results, repeat):
+    template = bl.core.MaterialTemplate(
+        'bench',
+        nodes={'wireframe': 'ShaderNodeWireframe',
+               'mix_shader': 'ShaderNodeMixShader'},
+        inputs={'wireframe': {0: 0.1}},
+        links=[('Principled BSDF', 0, 'mix_shader', 1),
+               ('wireframe', 0, 'mix_shader', 2),
+               ('mix_shader', 0, 'Material Output', 0)])
+
+    for n_materials in N_MATERIALS:
+        reset_scene()
+        names = [f'material_{i}' for i in range(n_materials)]
+
+        def get_nodes():
+            for name in names:
+                shader = bl.core.Shaders(name)
+                for node_name in ('Principled BSDF', 'Material Output',
+                                  'wireframe', 'mix_shader'):
+                    shader.get_node(node_name)
+
+        def apply_template():
+            for name in names:
+                template.apply(name)
+
+        results[f'shading/get_node/{n_materials}'] = timeit(get_nodes, repeat)
+        apply_template()
+        results[f'shading/template_reapply/{n_materials}'] = timeit(
+            apply_template, repeat)
+
+
+def bench_render(results, tmp_dir, repeat):
+    for res_x, res_y in RESOLUTIONS:
+        scene = reset_scene()
+        sc = bl.core.Scene()
+        sc.tmp_file_path = tmp_dir
+        sc.resolution_x, sc.resolution_y = res_x, res_y
+        scene.render.resolution_x = res_x
+        scene.render.resolution_y = res_y
+        scene.render.resolution_percentage = 100
+        scene.render.image_settings.file_format = 'PNG'
+
+        bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=4)
+        bpy.ops.object.light_add(type='SUN')
+        bpy.ops.object.camera_add(location=(0, -5, 0), rotation=(1.5708, 0, 0))
+        scene.camera = bpy.context.object
+        scene.use_nodes = True
+        sc.setup_composite_for_scene(scene, 0)
+
+        name = f'{res_x}x{res_y}'
+        results[f'render/{name}'] = timeit(
+            lambda: sc.render(path=os.path.join(tmp_dir, 'render.png')), repeat)
+
+        K = bl.core.Camera(scene.camera.name).get_intrinsic_camera_parameters(scene)
+        results[f'readback/rgb/{name}'] = timeit(
+            lambda: sc.get_rendered_img(scene, '/render', K), repeat)
+
+        passes_path = os.path.join(tmp_dir, f'passes{scene.frame_current:04d}.exr')
+        backup_path = os.path.join(tmp_dir, 'passes_backup.exr')
+        shutil.copy(passes_path, backup_path)
+        results[f'readback/passes/{name}'] = timeit(
+            lambda state: sc.read_render_passes(scene), repeat,
+            setup=lambda: shutil.copy(backup_path, passes_path))
+
+        z = sc.read_render_passes(scene, remove=False)['Depth']
+        for depth_type in bl.constants.DEPTH_TYPES:
+            results[f'depth/{depth_type}/{name}'] = timeit(
+                lambda: bl.core.convert_depth(
+                    z, K, scene.camera.data.clip_end, depth_type), repeat)
+
+
+def compare(results, baseline, threshold):
+    regressions = {}
+    for name, seconds in sorted(results.items()):
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = seconds / base
+        marker = 'REGRESSION' if ratio > threshold else ''
+        print(f'{name:45s} {base * 1e3:10.2f}ms -> {seconds * 1e3:10.2f}ms '
+              f'{ratio:6.2f}x {marker}')
+        if ratio > threshold:
+            regressions[name] = ratio
+    return regressions
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--threshold', type=float, default=1.2)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stages', nargs='+',
+                        default=['import', 'shading', 'render'])
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix='wh_bench_')
+    try:
+        if 'import' in args.stages:
+            bench_import(results, tmp_dir, args.repeat)
+        if 'shading' in args.stages:
+            bench_shading(results, args.repeat)
+        if 'render' in args.stages:
+            bench_render(results, tmp_dir, args.repeat)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'blender': bpy.app.version_string,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'samples': RENDER_SAMPLES,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,40 @@
-from . import utility
-from . import core
-from . import constants
+import importlib
+
+
+# Submodules are imported on first access (bl.core, bl.camera_model, ...),
+# so importing the package is cheap and the bpy-free modules (camera_model,
+# backproject, exr, dataset, scheduler, ...) also work outside Blender.
+__all__ = [
+    'utility',
+    'core',
+    'constants',
+    'constraints',
+    'readback',
+    'exr',
+    'scheduler',
+    'mesh_io',
+    'image_cache',
+    'session',
+    'tracing',
+    'camera_model',
+    'dataset',
+    'pipeline',
+    'backproject',
+    'segmentation',
+    'adaptive',
+    'settings',
+    'workqueue',
+    'server',
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module(f'.{name}', __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,54 @@
+import sys
+import json
+import argparse
+from .server import WorkerServer, DEFAULT_CALLBACK, submit
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='wh')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser(
+        'serve', help='keep warm Blender workers and serve jobs on a socket')
+    serve.add_argument('blend', help='base .blend loaded by every worker')
+    serve.add_argument('--socket', help='Unix socket path')
+    serve.add_argument('--workers', type=int, default=1)
+    serve.add_argument('--threads', type=int, default=0,
+                       help='render threads per worker, 0 for automatic')
+    serve.add_argument('--callback', default=DEFAULT_CALLBACK,
+                       help="'module:function' or 'file.py:function' run per job")
+    serve.add_argument('--blender', default='blender')
+
+    send = commands.add_parser('submit', help='send a JSON job to `wh serve`')
+    send.add_argument('job', help="job spec file, or '-' for stdin")
+    send.add_argument('--socket', help='Unix socket path')
+    send.add_argument('--timeout', type=float)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        server = WorkerServer(args.blend, args.socket, args.workers,
+                              args.threads, args.callback, args.blender)
+        server.start()
+        print(f'wh: {args.workers} worker(s) ready on {server.socket_path}',
+              flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.job == '-':
+        job = json.load(sys.stdin)
+    else:
+        with open(args.job) as f:
+            job = json.load(f)
+    reply = submit(job, args.socket, args.timeout)
+    if reply['ok']:
+        print(json.dumps(reply['result'], indent=2))
+        return 0
+    print(reply['error'], file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import numpy as np
+
+
+# Per-sample cost is modelled as proportional to BOUNCE_BASE + max_bounces
+BOUNCE_BASE = 2
+
+
+def estimate_noise(image):
+    """
+    Standard deviation of pixel noise in an (H, W[, C]) image from the
+    median absolute deviation of its Laplacian, which is robust to edges
+    and texture.
+    """
+    g = np.asarray(image, dtype=np.float32)
+    if g.ndim == 3:
+        g = g[..., :3].mean(axis=2)
+    if min(g.shape) < 3:
+        return 0.0
+    lap = (g[:-2, :-2] - 2 * g[:-2, 1:-1] + g[:-2, 2:]
+           - 2 * g[1:-1, :-2] + 4 * g[1:-1, 1:-1] - 2 * g[1:-1, 2:]
+           + g[2:, :-2] - 2 * g[2:, 1:-1] + g[2:, 2:])
+    mad = np.median(np.abs(lap - np.median(lap)))
+    # The kernel scales unit-variance noise by sqrt(36)
+    return float(1.4826 * mad / 6.0)
+
+
+class AdaptiveQuality:
+    """
+    Picks Cycles samples, adaptive threshold, bounce limit and denoising to
+    meet either a per-frame time_budget in seconds or a noise_target
+    (estimate_noise of the output), starting from one calibration render
+    and correcting from every measured frame after that.
+
+    Time is modelled as linear in samples and noise as 1 / sqrt(samples);
+    each update moves samples by (target / measured) ** gain. Bounces are
+    only lowered once samples would drop below min_samples.
+    """
+    def __init__(self, time_budget=None, noise_target=None, min_samples=8,
+                 max_samples=4096, min_bounces=2, max_bounces=12,
+                 calibration_samples=16, denoise_below=64, gain=0.5):
+        if (time_budget is None) == (noise_target is None):
+            raise ValueError('Give exactly one of time_budget or noise_target')
+        self.time_budget = time_budget
+        self.noise_target = noise_target
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.min_bounces = min_bounces
+        self.max_bounces = max_bounces
+        self.calibration_samples = calibration_samples
+        self.denoise_below = denoise_below
+        self.gain = gain
+
+        self.bounces = max_bounces
+        self.samples = None
+        self.denoise = False
+        self.cost = None
+        self.noise_scale = None
+        self.frames = []
+
+    @property
+    def calibrated(self):
+        return self.cost is not None
+
+    def calibration_settings(self):
+        # Adaptive sampling and denoising off, so the cost per sample is clean
+        return {'samples': self.calibration_samples,
+                'max_bounces': self.bounces,
+                'adaptive_threshold': None,
+                'denoise': False}
+
+    def settings(self):
+        if not self.calibrated:
+            return self.calibration_settings()
+        if self.noise_target is not None:
+            threshold = self.noise_target
+        else:
+            threshold = self.noise_scale / np.sqrt(self.samples)
+        return {'samples': self.samples,
+                'max_bounces': self.bounces,
+                'adaptive_threshold': float(np.clip(threshold, 0.001, 0.1)),
+                'denoise': self.denoise}
+
+    def apply(self, scene, settings=None):
+        settings = settings or self.settings()
+        cycles = scene.cycles
+        cycles.samples = int(settings['samples'])
+        cycles.max_bounces = int(settings['max_bounces'])
+        cycles.use_adaptive_sampling = settings['adaptive_threshold'] is not None
+        if settings['adaptive_threshold'] is not None:
+            cycles.adaptive_threshold = settings['adaptive_threshold']
+        cycles.use_denoising = settings['denoise']
+        return settings
+
+    def _set_bounces(self, bounces):
+        self.cost *= (BOUNCE_BASE + bounces) / (BOUNCE_BASE + self.bounces)
+        self.bounces = bounces
+
+    def _plan(self, samples):
+        # Trade bounces for samples when the budget cannot afford min_samples
+        if self.time_budget is not None:
+            while samples < self.min_samples and self.bounces > self.min_bounces:
+                old_cost = self.cost
+                self._set_bounces(self.bounces - 1)
+                samples *= old_cost / self.cost
+            while (samples > self.max_samples and self.bounces < self.max_bounces):
+                old_cost = self.cost
+                self._set_bounces(self.bounces + 1)
+                samples *= old_cost / self.cost
+
+        self.samples = int(np.clip(round(samples), self.min_samples,
+                                   self.max_samples))
+        if self.noise_target is not None:
+            self.denoise = samples > self.max_samples
+        else:
+            self.denoise = self.samples < self.denoise_below
+
+    def calibrate(self, seconds, image):
+        """Initialise the model from a render at calibration_settings()"""
+        samples = self.calibration_samples
+        self.cost = seconds / samples
+        self.noise_scale = estimate_noise(image) * np.sqrt(samples)
+        if self.time_budget is not None:
+            target = self.time_budget / self.cost
+        elif self.noise_scale > 0:
+            target = (self.noise_scale / self.noise_target) ** 2
+        else:
+            target = self.min_samples
+        self._plan(target)
+        return self.settings()
+
+    def update(self, seconds, image, settings=None):
+        """
+        Record a frame rendered with settings (default: the current ones)
+        and plan the next. Returns the frame's record.
+        """
+        settings = settings or self.settings()
+        noise = estimate_noise(image)
+        record = dict(settings, seconds=seconds, noise=noise)
+        self.frames.append(record)
+
+        self.cost = seconds / settings['samples']
+        if self.time_budget is not None:
+            ratio = self.time_budget / max(seconds, 1e-6)
+        elif noise > 0:
+            ratio = (noise / self.noise_target) ** 2
+        else:
+            ratio = 1.0
+        if not settings['denoise']:
+            self.noise_scale = noise * np.sqrt(settings['samples'])
+        self._plan(self.samples * ratio ** self.gain)
+        return record
+
+    def report(self):
+        """Per-frame settings with achieved seconds and noise"""
+        return list(self.frames)
@@ -0,0 +1,148 @@
+import functools
+import numpy as np
+from .constants import INVALID_POINT, PIXEL_CACHE_SIZE
+
+
+@functools.lru_cache(maxsize=PIXEL_CACHE_SIZE)
+def _pixel_rays(K, resolution):
+    f_x, _, c_x, _, f_y, c_y = K[:6]
+    res_x, res_y = resolution
+    x = (np.arange(res_x, dtype=np.float64) - c_x) / f_x
+    y = (np.arange(res_y, dtype=np.float64) - c_y) / f_y
+    rays = np.empty((res_y, res_x, 3), dtype=np.float32)
+    rays[..., 0] = x[None, :]
+    rays[..., 1] = y[:, None]
+    rays[..., 2] = 1
+    rays = rays.reshape(-1, 3)
+    lengths = np.linalg.norm(rays, axis=1)
+    rays.flags.writeable = False
+    lengths.flags.writeable = False
+    return rays, lengths
+
+
+def pixel_rays(K, resolution):
+    """
+    OpenCV camera rays through every pixel centre, scaled to z = 1, as a
+    (res_y * res_x, 3) array in row-major pixel order together with their
+    lengths. The last few (K, resolution) pairs are cached.
+    """
+    K = tuple(np.asarray(K, dtype=np.float64).ravel().tolist())
+    return _pixel_rays(K, tuple(resolution))
+
+
+def _per_frame(value, n, ndim):
+    if value is None:
+        return [None] * n
+    value = np.asarray(value)
+    if value.ndim == ndim:
+        return [value] * n
+    if len(value) != n:
+        raise ValueError(f'Expected {n} entries, got {len(value)}')
+    return value
+
+
+def depth_to_points(depth, K, RT_cv=None, rgb=None, mask=None,
+                    depth_type='planar', space='camera'):
+    """
+    Back-project depth maps from Scene.get_depth to 3D points.
+
+    depth is (res_y, res_x) or a batch (N, res_y, res_x); K, RT_cv, rgb and
+    mask may be given once for the whole batch or per frame. Pixels set to
+    INVALID_POINT, non-finite or non-positive are dropped. space='world'
+    maps points through RT_cv, otherwise they stay in OpenCV camera space.
+
+    Returns a dict with 'points' (M, 3), 'pixels' (M, 2) as (u, v), and
+    'frames' (M,) for batches, plus 'colors' and 'labels' when rgb and
+    mask are given.
+    """
+    if depth_type not in ('planar', 'ray'):
+        raise ValueError(f'Cannot back-project {depth_type} depth, '
+                         "expected 'planar' or 'ray'")
+    if space not in ('camera', 'world'):
+        raise ValueError(f"Unknown space {space}, expected 'camera' or 'world'")
+    if space == 'world' and RT_cv is None:
+        raise ValueError("space='world' needs RT_cv")
+
+    depth = np.asarray(depth)
+    batched = depth.ndim == 3
+    if not batched:
+        depth = depth[None]
+    n, res_y, res_x = depth.shape
+    Ks = _per_frame(K, n, 2)
+    RTs = _per_frame(RT_cv, n, 2)
+    rgbs = _per_frame(rgb, n, 3)
+    masks = _per_frame(mask, n, 2)
+
+    outputs = {'points': [], 'pixels': [], 'frames': []}
+    if rgb is not None:
+        outputs['colors'] = []
+    if mask is not None:
+        outputs['labels'] = []
+
+    for i in range(n):
+        z = depth[i].reshape(-1)
+        idx = np.flatnonzero((z != INVALID_POINT) & np.isfinite(z) & (z > 0))
+        rays, lengths = pixel_rays(Ks[i], (res_x, res_y))
+        z = z[idx]
+        if depth_type == 'ray':
+            z = z / lengths[idx]
+        points = rays[idx] * z[:, None]
+
+        if space == 'world':
+            RT = np.asarray(RTs[i], dtype=np.float64)
+            # X_world = R^T (X_cv - T), written for row vectors
+            points = ((points - RT[:, 3]) @ RT[:, :3]).astype(np.float32)
+
+        outputs['points'].append(points)
+        outputs['pixels'].append(np.stack(np.divmod(idx, res_x)[::-1], axis=1))
+        outputs['frames'].append(np.full(len(idx), i, dtype=np.int32))
+        if rgb is not None:
+            colors = rgbs[i]
+            outputs['colors'].append(colors.reshape(-1, colors.shape[-1])[idx])
+        if mask is not None:
+            outputs['labels'].append(masks[i].reshape(-1)[idx])
+
+    outputs = {key: np.concatenate(values) for key, values in outputs.items()}
+    if not batched:
+        del outputs['frames']
+    return outputs
+
+
+def voxel_downsample(points, voxel_size, colors=None, labels=None):
+    """
+    Merge points falling in the same voxel of a regular grid into their
+    centroid, e.g. to fuse several views from depth_to_points. Colours are
+    averaged; each voxel keeps the label of its first point.
+
+    Returns a dict with 'points' and, when given, 'colors' and 'labels'.
+    """
+    points = np.asarray(points)
+    if not len(points):
+        outputs = {'points': points.reshape(0, 3)}
+        if colors is not None:
+            outputs['colors'] = np.asarray(colors)[:0]
+        if labels is not None:
+            outputs['labels'] = np.asarray(labels)[:0]
+        return outputs
+
+    cells = np.floor(points / voxel_size).astype(np.int64)
+    cells -= cells.min(axis=0)
+    dims = cells.max(axis=0) + 1
+    keys = np.ravel_multi_index(cells.T, dims)
+    _, first, inverse, counts = np.unique(keys, return_index=True,
+                                          return_inverse=True,
+                                          return_counts=True)
+
+    def mean(values):
+        values = np.asarray(values)
+        sums = np.stack([np.bincount(inverse, weights=values[:, c],
+                                     minlength=len(counts))
+                         for c in range(values.shape[1])], axis=1)
+        return (sums / counts[:, None]).astype(values.dtype)
+
+    outputs = {'points': mean(points)}
+    if colors is not None:
+        outputs['colors'] = mean(colors)
+    if labels is not None:
+        outputs['labels'] = np.asarray(labels)[first]
+    return outputs
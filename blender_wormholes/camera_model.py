@@ -0,0 +1,177 @@
+import numpy as np
+from .constants import CAMERA_DATA_ATTRS
+
+
+# Blender cameras look down -Z with Y up, OpenCV down +Z with Y down
+R_BCAM2CV = np.array([[1,  0,  0],
+                      [0, -1,  0],
+                      [0,  0, -1]], dtype=np.float64)
+
+# Render settings read by intrinsics_from_settings, next to the camera's
+# CAMERA_DATA_ATTRS
+RENDER_ATTRS = ('resolution_x', 'resolution_y', 'resolution_percentage',
+                'pixel_aspect_x', 'pixel_aspect_y')
+
+
+def intrinsics(lens, sensor_width, sensor_height, sensor_fit, resolution_x,
+               resolution_y, resolution_percentage=100, pixel_aspect_x=1.0,
+               pixel_aspect_y=1.0, shift_x=0.0, shift_y=0.0):
+    """
+    K matrices of shape (N, 3, 3) for Blender camera settings. Every
+    argument may be a scalar or an array of N values.
+    """
+    (lens, sensor_width, sensor_height, sensor_fit, resolution_x,
+     resolution_y, resolution_percentage, pixel_aspect_x, pixel_aspect_y,
+     shift_x, shift_y) = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(a)) for a in (
+            lens, sensor_width, sensor_height, sensor_fit, resolution_x,
+            resolution_y, resolution_percentage, pixel_aspect_x,
+            pixel_aspect_y, shift_x, shift_y)])
+
+    resolution_scale = resolution_percentage / 100.0
+    res_x = np.floor(resolution_x * resolution_scale)
+    res_y = np.floor(resolution_y * resolution_scale)
+
+    sensor_size_in_mm = np.where(sensor_fit == 'VERTICAL',
+                                 sensor_height, sensor_width)
+    size_x = pixel_aspect_x * res_x
+    size_y = pixel_aspect_y * res_y
+    horizontal = (sensor_fit == 'HORIZONTAL') | (
+        (sensor_fit == 'AUTO') & (size_x >= size_y))
+
+    pixel_aspect_ratio = pixel_aspect_y / pixel_aspect_x
+    view_fac_in_px = np.where(horizontal, res_x, pixel_aspect_ratio * res_y)
+    pixel_size_mm_per_px = (sensor_size_in_mm / lens) / view_fac_in_px
+
+    K = np.zeros(lens.shape + (3, 3))
+    K[:, 0, 0] = 1.0 / pixel_size_mm_per_px
+    K[:, 1, 1] = (1.0 / pixel_size_mm_per_px) / pixel_aspect_ratio
+    K[:, 0, 2] = (res_x - 1) / 2.0 - shift_x * view_fac_in_px
+    K[:, 1, 2] = (res_y - 1) / 2.0 + (shift_y * view_fac_in_px) / pixel_aspect_ratio
+    K[:, 2, 2] = 1
+    return K
+
+
+def _get(source, name):
+    if isinstance(source, dict):
+        return source[name]
+    return getattr(source, name)
+
+
+def intrinsics_from_settings(camera, render):
+    """
+    intrinsics() from camera data and render settings, given as Blender
+    datablocks (camera.data, scene.render) or dicts of scalars or arrays
+    keyed like CAMERA_DATA_ATTRS and RENDER_ATTRS.
+    """
+    camera = {attr: _get(camera, attr) for attr in CAMERA_DATA_ATTRS}
+    render = {attr: _get(render, attr) for attr in RENDER_ATTRS}
+    return intrinsics(camera['lens'], camera['sensor_width'],
+                      camera['sensor_height'], camera['sensor_fit'],
+                      render['resolution_x'], render['resolution_y'],
+                      render['resolution_percentage'],
+                      render['pixel_aspect_x'], render['pixel_aspect_y'],
+                      camera['shift_x'], camera['shift_y'])
+
+
+def _axis_rotation(axis, angle):
+    c = np.cos(angle)
+    s = np.sin(angle)
+    R = np.zeros(angle.shape + (3, 3))
+    i, j = {'X': (1, 2), 'Y': (2, 0), 'Z': (0, 1)}[axis]
+    k = 3 - i - j
+    R[:, k, k] = 1
+    R[:, i, i] = c
+    R[:, j, j] = c
+    R[:, i, j] = -s
+    R[:, j, i] = s
+    return R
+
+
+def euler_to_matrix(angles, order='XYZ'):
+    """
+    (N, 3) Blender euler angles in radians to (N, 3, 3) rotations. As in
+    Blender, 'XYZ' applies X first, i.e. R = Rz @ Ry @ Rx.
+    """
+    angles = np.atleast_2d(np.asarray(angles, dtype=np.float64))
+    R = np.broadcast_to(np.eye(3), (len(angles), 3, 3))
+    for axis in order:
+        R = _axis_rotation(axis, angles[:, 'XYZ'.index(axis)]) @ R
+    return R
+
+
+def quaternion_to_matrix(quaternions):
+    """(N, 4) w, x, y, z quaternions to (N, 3, 3) rotations"""
+    q = np.atleast_2d(np.asarray(quaternions, dtype=np.float64))
+    w, x, y, z = (q / np.linalg.norm(q, axis=1, keepdims=True)).T
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], -1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], -1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], -1),
+    ], axis=1)
+
+
+def compose_matrix_world(location, rotation, scale):
+    """(N, 4, 4) matrices from (N, 3) locations, (N, 3, 3) rotations and (N, 3) scales"""
+    location = np.atleast_2d(location)
+    M = np.zeros((len(location), 4, 4))
+    M[:, :3, :3] = rotation * np.atleast_2d(scale)[:, None, :]
+    M[:, :3, 3] = location
+    M[:, 3, 3] = 1
+    return M
+
+
+def extrinsics(matrix_world):
+    """
+    World to OpenCV camera [R | T] of shape (N, 3, 4) from (N, 4, 4) Blender
+    camera matrix_world. Object scale is ignored.
+    """
+    matrix_world = np.asarray(matrix_world, dtype=np.float64).reshape(-1, 4, 4)
+    location = matrix_world[:, :3, 3:]
+    R_bcam2world = matrix_world[:, :3, :3]
+    R_bcam2world = R_bcam2world / np.linalg.norm(R_bcam2world, axis=1,
+                                                 keepdims=True)
+    R_world2bcam = np.swapaxes(R_bcam2world, 1, 2)
+    T_world2bcam = -R_world2bcam @ location
+
+    R_world2cv = R_BCAM2CV @ R_world2bcam
+    T_world2cv = R_BCAM2CV @ T_world2bcam
+    return np.concatenate((R_world2cv, T_world2cv), axis=2)
+
+
+def projection(K, RT):
+    """(N, 3, 4) projection matrices P = K @ [R | T]"""
+    return np.asarray(K) @ np.asarray(RT)
+
+
+def camera_to_world(RT):
+    """
+    Inverse of extrinsics(): (N, 4, 4) Blender camera matrix_world from
+    (N, 3, 4) world to OpenCV camera [R | T].
+    """
+    RT = np.asarray(RT, dtype=np.float64).reshape(-1, 3, 4)
+    R_world2cv = RT[:, :, :3]
+    R_bcam2world = np.swapaxes(R_BCAM2CV @ R_world2cv, 1, 2)
+    M = np.zeros((len(RT), 4, 4))
+    M[:, :3, :3] = R_bcam2world
+    M[:, :3, 3] = -(np.swapaxes(R_world2cv, 1, 2) @ RT[:, :, 3:])[:, :, 0]
+    M[:, 3, 3] = 1
+    return M
+
+
+def project_points(P, points):
+    """
+    Project world points with projection matrices P (3, 4) or (N, 3, 4).
+    points is (M, 3), or (N, M, 3) for different points per camera.
+    Returns pixel coordinates (N, M, 2) and OpenCV depths (N, M); points
+    behind a camera get a negative depth.
+    """
+    P = np.asarray(P, dtype=np.float64).reshape(-1, 3, 4)
+    points = np.asarray(points, dtype=np.float64)
+    homogeneous = np.concatenate(
+        (points, np.ones(points.shape[:-1] + (1,))), axis=-1)
+    projected = homogeneous @ np.swapaxes(P, 1, 2)
+    depth = projected[..., 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        uv = projected[..., :2] / depth[..., None]
+    return uv, depth
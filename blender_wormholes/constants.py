@@ -5,3 +5,46 @@ SHADER_NODE_TYPE = {
     'wireframe': "ShaderNodeWireframe",
     'mix_shader': "ShaderNodeMixShader"
 }
+
+# Value written to depth pixels with no surface (beyond clip_end)
+INVALID_POINT = -1.0
+
+DEPTH_TYPES = ('planar', 'ray', 'disparity')
+
+# Passes written to the multilayer EXR by Scene.setup_composite_for_scene
+RENDER_PASSES = ('IndexOB', 'Depth')
+
+# View layer property enabling each render pass
+PASS_PROPERTIES = {
+    'IndexOB': 'use_pass_object_index',
+    'Depth': 'use_pass_z',
+    'Normal': 'use_pass_normal',
+    'Vector': 'use_pass_vector',
+}
+
+# Material custom property holding the hash of the applied MaterialTemplate
+TEMPLATE_HASH_KEY = 'wh_template_hash'
+
+# bpy.data collection holding each type of object data
+OBJECT_DATA_COLLECTIONS = {
+    'Mesh': 'meshes',
+    'Curve': 'curves',
+    'Camera': 'cameras',
+    'Light': 'lights',
+    'PointCloud': 'pointclouds',
+}
+
+# Camera data properties that enter the intrinsic matrix
+CAMERA_DATA_ATTRS = ('lens', 'sensor_width', 'sensor_height', 'sensor_fit',
+                     'shift_x', 'shift_y')
+
+# Shared geometry-nodes group and per-object modifier used by PointCloud
+POINT_CLOUD_NODE_GROUP = 'wh_point_cloud'
+POINT_CLOUD_MODIFIER = 'wh_points'
+
+# Per-pixel ray/depth-norm arrays kept per (K, resolution), least recently
+# used first out
+PIXEL_CACHE_SIZE = 8
+
+# Largest Object.pass_index Blender stores; larger values are clamped
+MAX_PASS_INDEX = 32767
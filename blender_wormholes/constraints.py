@@ -4,17 +4,36 @@ class Constraints:
     def __init__(self, name = None):
         self.name = name
 
-    def track_to(self, target_name, subtarget_name, influence, name):
-        bpy.ops.object.constraint_add(type="TRACK_TO")
-        # if self.name is not None:
-        #     self.name = 'Track To.001'
-        bpy.context.object.constraints[name].target = bpy.data.objects[target_name]
-        bpy.context.object.constraints[name].subtarget = subtarget_name
-        bpy.context.object.constraints[name].track_axis = "TRACK_NEGATIVE_Z"
-        bpy.context.object.constraints[name].up_axis = "UP_Y"
-        bpy.context.object.constraints[name].influence = influence
+    def objects(self, obj_names=None):
+        # Falls back to the active object when no object name was given
+        if obj_names is not None:
+            return [bpy.data.objects[obj_name] for obj_name in obj_names]
+        if self.name is not None:
+            return [bpy.data.objects[self.name]]
+        return [bpy.context.object]
 
-    def follow_path(self, target_name, influence, name):
-        bpy.ops.object.constraint_add(type="FOLLOW_PATH")
-        bpy.context.object.constraints[name].target = bpy.data.objects[target_name]
-        bpy.context.object.constraints[name].influence = influence
+    def track_to(self, target_name, subtarget_name, influence, name,
+                 obj_names=None):
+        target = bpy.data.objects[target_name]
+        constraints = []
+        for obj in self.objects(obj_names):
+            constraint = obj.constraints.new(type="TRACK_TO")
+            constraint.name = name
+            constraint.target = target
+            constraint.subtarget = subtarget_name
+            constraint.track_axis = "TRACK_NEGATIVE_Z"
+            constraint.up_axis = "UP_Y"
+            constraint.influence = influence
+            constraints.append(constraint)
+        return constraints
+
+    def follow_path(self, target_name, influence, name, obj_names=None):
+        target = bpy.data.objects[target_name]
+        constraints = []
+        for obj in self.objects(obj_names):
+            constraint = obj.constraints.new(type="FOLLOW_PATH")
+            constraint.name = name
+            constraint.target = target
+            constraint.influence = influence
+            constraints.append(constraint)
+        return constraints
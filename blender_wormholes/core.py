@@ -1,30 +1,166 @@
 import os
 import bpy
+import json
+import math
+import hashlib
+import functools
+import time
 import numpy as np
 import random
 from mathutils import Matrix, Vector
-from .constants import SHADER_NODE_TYPE
+from .constants import SHADER_NODE_TYPE, INVALID_POINT, DEPTH_TYPES
+from .constants import RENDER_PASSES, PASS_PROPERTIES, TEMPLATE_HASH_KEY
+from .constants import OBJECT_DATA_COLLECTIONS, CAMERA_DATA_ATTRS
+from .constants import PIXEL_CACHE_SIZE
+from .constants import POINT_CLOUD_NODE_GROUP, POINT_CLOUD_MODIFIER
+from .exr import read_exr, EXR_CODECS
+from .readback import read_pixels
+from .mesh_io import read_mesh, fill_mesh, update_mesh, update_points
+from .mesh_io import MESH_WRITERS, object_arrays, write_mesh, export_meshes
+from .session import RenderSession
+from .segmentation import decode_mask
+from .settings import SceneConfig, ConfigApplier, _same
+from . import camera_model
+
+
+@functools.lru_cache(maxsize=PIXEL_CACHE_SIZE)
+def _depth_norm(K, resolution):
+    res_x, res_y = resolution
+    f_x, _, c_x, _, f_y, c_y = K[:6]
+    a = (c_x - np.arange(res_x, dtype=np.float64)) / f_x
+    b = (c_y - np.arange(res_y, dtype=np.float64)) / f_y
+    norm = np.sqrt(1.0 + a[None, :] ** 2 + b[:, None] ** 2)
+    norm = norm.astype(np.float32)
+    norm.flags.writeable = False
+    return norm
+
+
+def get_depth_norm(K, resolution):
+    """
+    Per-pixel ratio between ray length and planar depth, cached for the
+    last few (K, resolution) pairs so a fixed camera only pays for it once.
+    """
+    K = tuple(np.asarray(K, dtype=np.float64).ravel().tolist())
+    return _depth_norm(K, tuple(resolution))
+
+
+def convert_depth(z, K, max_dist, depth_type='planar'):
+    """
+    Convert Blender's ray-length depth (res_y, res_x) to the requested
+    convention. Points at infinity get INVALID_POINT.
+    """
+    if depth_type not in DEPTH_TYPES:
+        raise ValueError(f'Unknown depth type {depth_type}, '
+                         f'expected one of {DEPTH_TYPES}')
+    res_y, res_x = z.shape
+    invalid = z > max_dist
+    if depth_type == 'ray':
+        depth = np.array(z, dtype=np.float32)
+    else:
+        depth = np.divide(z, get_depth_norm(K, (res_x, res_y)),
+                          dtype=np.float32)
+        if depth_type == 'disparity':
+            valid = ~invalid & (depth > 0)
+            np.divide(1.0, depth, out=depth, where=valid)
+            if valid.any():
+                depth /= depth[valid].max()
+    depth[invalid] = INVALID_POINT
+    return depth
+
+
+def index_to_mask(index_ob, dtype=np.uint16):
+    return decode_mask(index_ob, dtype)
+
+
+def decode_render_passes(path, K, max_dist, depth_type='planar', remove=True):
+    """
+    bpy-free decoding of a passes EXR into 'mask' and 'depth' plus every
+    raw layer, safe to run on a worker thread.
+    """
+    outputs = read_exr(path)
+    if remove:
+        os.remove(path)
+    if 'IndexOB' in outputs:
+        outputs['mask'] = index_to_mask(outputs['IndexOB'])
+    if 'Depth' in outputs:
+        outputs['depth'] = convert_depth(outputs['Depth'], K, max_dist,
+                                         depth_type)
+    return outputs
 
 
 class Scene:
-    def __init__(self):
+    def __init__(self, image_cache=None):
         self.scene = bpy.context.scene
-        
+        self.image_cache = image_cache
+        self.scene_config = SceneConfig()
+        self.config_applier = ConfigApplier(self.scene)
+
     def initialize_image_settings(self, settings):
-        self.scene.render.resolution_x = settings['resolution'][0]
-        self.scene.render.resolution_y = settings['resolution'][1]
-        self.scene.render.filepath = settings['output_path']
-        self.scene.render.image_settings.file_format = settings['file_format']
-        self.scene.render.film_transparent = settings['film_transparent'] 
+        render = {}
+        if 'resolution' in settings:
+            render['resolution_x'] = settings['resolution'][0]
+            render['resolution_y'] = settings['resolution'][1]
+        if 'output_path' in settings:
+            render['filepath'] = settings['output_path']
+        if 'film_transparent' in settings:
+            render['film_transparent'] = settings['film_transparent']
+        image = {}
+        if 'file_format' in settings:
+            image['file_format'] = settings['file_format']
+        return self._apply_sections(render=render, image=image)
 
     def initialize_rendering_settings(self, settings):
-        self.scene.render.engine = settings['engine']
-        self.scene.cycles.progressive = settings['engine_type']
-        self.scene.cycles.use_adaptive_sampling = settings['use_adaptive_sampling']
-        self.scene.cycles.max_bounces = settings['max_bounces']
-        self.scene.cycles.samples = settings['sample_size']
+        keys = {'engine_type': 'progressive',
+                'use_adaptive_sampling': 'use_adaptive_sampling',
+                'max_bounces': 'max_bounces',
+                'sample_size': 'samples'}
+        cycles = {keys[key]: value for key, value in settings.items()
+                  if key in keys}
+        render = {'engine': settings['engine']} if 'engine' in settings else {}
+        return self._apply_sections(render=render, cycles=cycles)
+
+    def _apply_sections(self, **sections):
+        # Keep them in the config, but only write these values, so settings
+        # changed since (e.g. samples by AdaptiveQuality) are left alone
+        self.scene_config = self.scene_config.updated(**sections)
+        return self.config_applier.apply(SceneConfig(**sections))
+
+    def apply_config(self, config=None, **overrides):
+        """
+        Make config (a SceneConfig or dict) the scene's settings, writing only
+        the properties that changed since the last call. overrides
+        (output_path, seed, samples) win over config for this call. Returns
+        the changed RNA paths.
+        """
+        if config is not None:
+            if isinstance(config, dict):
+                config = SceneConfig.from_dict(config)
+            self.scene_config = config
+        return self.config_applier.apply(self.scene_config, **overrides)
+
+    def add_objects(self, filepath, loader='native', cache_dir=None):
+        """
+        Import an OBJ/PLY and return it as an Object with its origin at the
+        geometry median. The native loader builds the mesh from NumPy with
+        foreach_set (caching parsed arrays in cache_dir) and creates the
+        OBJ's usemtl materials from their .mtl diffuse colour and texture;
+        loader='operator' uses Blender's importers.
+        """
+        if loader == 'native':
+            name = os.path.splitext(os.path.basename(filepath))[0]
+            data = read_mesh(filepath, cache_dir=cache_dir)
+            center = np.zeros(3, dtype=np.float32)
+            if len(data['vertices']):
+                center = data['vertices'].mean(axis=0)
+            data['vertices'] = data['vertices'] - center
+            mesh = bpy.data.meshes.new(name)
+            self.add_mesh_materials(mesh, data)
+            fill_mesh(mesh, data)
+            obj = bpy.data.objects.new(name, mesh)
+            obj.location = center.tolist()
+            bpy.context.collection.objects.link(obj)
+            return Object(obj_name = obj.name)
 
-    def add_objects(self, filepath):
         old_objs = set(self.scene.objects)
         if '.obj' in filepath:
                 bpy.ops.import_scene.obj(filepath=filepath, split_mode='OFF')
@@ -35,10 +171,59 @@ class Scene:
         name = list(imported_objs)[0].name
         return Object(obj_name = name)
 
-    def delete_objects(self, obj_name):
-        self.deselect_all()
-        self.select_object(obj_name)
-        bpy.ops.object.delete()
+    def add_mesh_materials(self, mesh, data):
+        """
+        New material slots on mesh for the OBJ materials in a read_mesh
+        dict, one new material per name as Blender's OBJ importer does.
+        """
+        if 'material_names' not in data:
+            return
+        for name, color, texture in zip(data['material_names'],
+                                        data['material_colors'],
+                                        data['material_textures']):
+            mat = bpy.data.materials.new(str(name))
+            mat.diffuse_color = color.tolist()
+            mat.use_nodes = True
+            bsdf = mat.node_tree.nodes.get('Principled BSDF')
+            if bsdf is not None:
+                bsdf.inputs['Base Color'].default_value = color.tolist()
+                bsdf.inputs['Alpha'].default_value = float(color[3])
+                if texture and os.path.exists(str(texture)):
+                    tex = mat.node_tree.nodes.new('ShaderNodeTexImage')
+                    tex.image = self.load_image(str(texture))
+                    mat.node_tree.links.new(tex.outputs['Color'],
+                                            bsdf.inputs['Base Color'])
+            mesh.materials.append(mat)
+
+    def delete_objects(self, obj_names):
+        """
+        Remove one object name or a list of them through bpy.data, along
+        with their object data once nothing else uses it.
+        """
+        if isinstance(obj_names, str):
+            obj_names = [obj_names]
+        for obj_name in obj_names:
+            obj = bpy.data.objects.get(obj_name)
+            if obj is None:
+                continue
+            data = obj.data
+            bpy.data.objects.remove(obj, do_unlink=True)
+            if data is not None and data.users == 0:
+                collection = OBJECT_DATA_COLLECTIONS.get(type(data).__name__)
+                if collection is not None:
+                    getattr(bpy.data, collection).remove(data)
+
+    def export_meshes(self, obj_names, paths, evaluated=False,
+                      world_space=False, pipeline=None, attributes=()):
+        """
+        Write several objects to .ply/.npz in one call, compressing and
+        writing on a thread pool, see mesh_io.export_meshes. attributes
+        names extra mesh attributes to store next to the geometry.
+        """
+        objects = [bpy.data.objects[name] for name in obj_names]
+        return export_meshes(objects, paths, evaluated=evaluated,
+                             world_space=world_space, pipeline=pipeline,
+                             attributes=attributes)
 
     def set_camera(self):
         pass
@@ -48,6 +233,13 @@ class Scene:
             self.scene.render.filepath = path
         bpy.ops.render.render(write_still=True, animation=animation)
 
+    def render_session(self):
+        """
+        Persistent-data render session, use as
+        `with sc.render_session() as session: session.render(path)`
+        """
+        return RenderSession(self.scene)
+
     def current_mode(self):
         return self.obj.mode
 
@@ -58,9 +250,15 @@ class Scene:
         pass
 
     def select_object(self, obj_name):
+        self.select_objects([obj_name])
+
+    def select_objects(self, obj_names):
+        """Select only obj_names, the last one becoming active"""
         self.deselect_all()
-        obj = bpy.data.objects[obj_name]
-        obj.select_set(True)
+        obj = None
+        for obj_name in obj_names:
+            obj = bpy.data.objects[obj_name]
+            obj.select_set(True)
         bpy.context.view_layer.objects.active = obj
 
     def select_bone(self, bone):
@@ -68,11 +266,18 @@ class Scene:
         self.armature.bones[bone].select = True
 
     def deselect_all(self):
-        bpy.ops.object.select_all(action='DESELECT')
+        # Only touches what is selected, not every object in the scene
+        for obj in bpy.context.selected_objects:
+            obj.select_set(False)
         bpy.context.view_layer.objects.active = None
 
+    def load_image(self, image_path):
+        if self.image_cache is not None:
+            return self.image_cache.get(image_path)
+        return bpy.data.images.load(image_path)
+
     def apply_hdri(self, image_path):
-        self.env_texture_node.image = bpy.data.images.load(image_path)
+        self.env_texture_node.image = self.load_image(image_path)
         self.mapping_node.inputs[2].default_value[2] = random.randint(
             -180, 180)
         bpy.context.view_layer.update()
@@ -98,44 +303,56 @@ class Scene:
         world.node_tree.links.new(
             tex_coord_node.outputs['Generated'], self.mapping_node.inputs['Vector'])
 
-    def setup_composite_for_scene(self, scene, image_id):
-        scene.node_tree.nodes.clear()
+    def setup_composite_for_scene(self, scene, image_id, passes=RENDER_PASSES,
+                                  exr_codec='ZIP', clear=True):
+        """
+        Write the requested render passes (IndexOB, Depth, Normal, Vector)
+        into a single multilayer EXR per frame. NONE, RLE, ZIPS and ZIP
+        codecs are decoded without OpenEXR, see exr.read_exr. With
+        clear=False the nodes are added next to the existing compositor
+        tree instead of replacing it.
+        """
+        if exr_codec not in EXR_CODECS:
+            raise ValueError(f'Unknown EXR codec {exr_codec}')
+        if clear:
+            scene.node_tree.nodes.clear()
+
+        view_layer = bpy.context.view_layer
+        for pass_name in passes:
+            setattr(view_layer, PASS_PROPERTIES[pass_name], True)
 
         render_node = scene.node_tree.nodes.new('CompositorNodeRLayers')
         composite = scene.node_tree.nodes.new('CompositorNodeComposite')
 
-        # For Segmentation
         file_out = scene.node_tree.nodes.new('CompositorNodeOutputFile')
-        file_out.base_path = f'{self.tmp_file_path}'
-        file_out.format.exr_codec = 'PIZ'
-        file_out.format.file_format = 'OPEN_EXR'
-
-        # For depth image
-        file_out_1 = scene.node_tree.nodes.new('CompositorNodeOutputFile')
-        file_out_1.base_path = f'{self.tmp_file_path}'
-        file_out_1.format.exr_codec = 'PIZ'
-        file_out_1.format.file_format = 'OPEN_EXR'
-
-        # math_node  = scene.node_tree.nodes.new('CompositorNodeMath')
-        # math_node.operation = 'DIVIDE'
-        # math_node.inputs[1].default_value = 255
-
-        file_out.file_slots[0].path = 'segmentation'
-        file_out_1.file_slots[0].path = 'depth'
+        file_out.base_path = f'{self.tmp_file_path}/passes'
+        file_out.format.file_format = 'OPEN_EXR_MULTILAYER'
+        file_out.format.color_depth = '32'
+        file_out.format.exr_codec = exr_codec
+        file_out.layer_slots.clear()
 
         scene.node_tree.links.new(
             render_node.outputs['Image'], composite.inputs['Image'])
-        scene.node_tree.links.new(
-            render_node.outputs['IndexOB'], file_out.inputs[0])
-        # scene.node_tree.links.new(math_node.outputs['Value'], file_out.inputs[0])
-        scene.node_tree.links.new(
-            render_node.outputs['Depth'], file_out_1.inputs[0])
+        for pass_name in passes:
+            file_out.layer_slots.new(pass_name)
+            scene.node_tree.links.new(
+                render_node.outputs[pass_name], file_out.inputs[pass_name])
+
+    def read_render_passes(self, scene, remove=True):
+        """
+        Decode every layer of the frame's multilayer EXR in one pass,
+        without going through bpy.data.images.
+        """
+        tmp_file_path = f'{self.tmp_file_path}/passes{scene.frame_current:04d}.exr'
+        passes = read_exr(tmp_file_path)
+        if remove:
+            os.remove(tmp_file_path)
+        return passes
 
     def apply_render_settings(self, high_quality):
         scene = bpy.context.scene
         bpy.context.scene.cycles.progressive = self.cycles_type
         bpy.context.scene.cycles.use_adaptive_sampling = self.use_adaptive_sampling
-        scene.cycles.max_bounces = 12
         if high_quality:
             scene.cycles.samples = self.sample_size_hi
             if self.subsurface_scattering:
@@ -168,81 +385,113 @@ class Scene:
             scene.cycles.samples = self.sample_size_low
             bpy.data.materials[1].node_tree.nodes['Principled BSDF'].inputs[1].default_value = 0
 
-    def render_one_frame(self, high_quality=True,  write_still=True):
+    def _still_path(self):
+        # render(write_still=True) writes filepath without a frame number,
+        # unlike frame_path()
+        render = self.scene.render
+        path = bpy.path.abspath(render.filepath)
+        if render.use_file_extension and not path.endswith(render.file_extension):
+            path += render.file_extension
+        return path
+
+    def _timed_render(self):
+        start = time.perf_counter()
+        bpy.ops.render.render(write_still=True)
+        seconds = time.perf_counter() - start
+        image = read_pixels(self._still_path(), 'quality', channels=slice(0, 3))
+        return seconds, image
+
+    def render_one_frame(self, high_quality=True,  write_still=True,
+                         quality=None):
+        """
+        With an AdaptiveQuality, samples, bounces, adaptive threshold and
+        denoising come from it instead: the first call adds a calibration
+        render, and every frame's time and noise feed back into the next.
+        Returns the frame's quality record in that case. write_still is
+        ignored then, the still is always written to measure its noise.
+        """
         self.apply_render_settings(high_quality)
         self.scene.render.filepath = self.render_filepath
         self.scene.render.image_settings.file_format = self.config['image_format']
 
-        bpy.ops.render.render(write_still=write_still)
+        record = None
+        if quality is None:
+            bpy.ops.render.render(write_still=write_still)
+        else:
+            if not quality.calibrated:
+                quality.apply(self.scene, quality.calibration_settings())
+                quality.calibrate(*self._timed_render())
+            settings = quality.apply(self.scene)
+            seconds, image = self._timed_render()
+            record = quality.update(seconds, image, settings)
         bpy.context.scene.node_tree.nodes.clear()
+        return record
 
-    def get_rendered_outputs(self, scene, img_id, K):
-        depth = self.get_depth(scene, img_id, K)
+    def get_rendered_outputs(self, scene, img_id, K, depth_type='planar'):
+        passes = self.read_render_passes(scene)
+        depth = self.get_depth(scene, img_id, K, depth_type, passes=passes)
         # rendered_img = self.get_rendered_img(scene, img_id, K)
-        seg_img = self.get_segmentation_mask(scene, img_id, K)
+        seg_img = self.get_segmentation_mask(scene, img_id, K, passes=passes)
         return seg_img, depth
 
-    def get_rendered_img(self, scene, img_id, K):
+    def submit_rendered_outputs(self, pipeline, scene, img_id, K, callback,
+                                depth_type='planar'):
+        """
+        Hand this frame's passes to an OutputPipeline. The EXR is moved to a
+        per-frame name on the main thread so the next render can start; it
+        is then decoded and converted on a worker, which calls
+        callback(img_id, outputs) with 'mask', 'depth' and the raw passes.
+        """
+        tmp_file_path = f'{self.tmp_file_path}/passes{scene.frame_current:04d}.exr'
+        frame_file_path = f'{self.tmp_file_path}/passes_{img_id}.exr'
+        os.replace(tmp_file_path, frame_file_path)
+        max_dist = scene.camera.data.clip_end
+        K = np.array(K, dtype=np.float64)
+
+        def process():
+            outputs = decode_render_passes(frame_file_path, K, max_dist,
+                                           depth_type)
+            return callback(img_id, outputs)
+        return pipeline.submit(process)
+
+    def get_rendered_img(self, scene, img_id, K, copy=False):
+        """
+        RGB of the rendered PNG, clipped to [0, 1]. Without copy this is a
+        view into the shared readback buffer that the next call overwrites,
+        so pass copy=True for images that are kept or handed to an
+        OutputPipeline or ShardWriter.
+        """
         tmp_file_path = f'{self.tmp_file_path}{img_id}.png'
-        out_data = bpy.data.images.load(tmp_file_path)
-        pixels_numpy = np.array(out_data.pixels[:])
-        res_x = self.resolution_x
-        res_y = self.resolution_y
-        # Numpy works with (y, x, channels)
-        pixels_numpy.resize((res_y, res_x, 4))
-        # flip vertically (in Blender y in the image points up instead of down)
-        pixels_numpy = np.flip(pixels_numpy, 0)
-        img = pixels_numpy[:, :, :3]
-        img = np.clip(img, 0, 1)
+        img = read_pixels(tmp_file_path, 'rgb', channels=slice(0, 3))
+        if copy:
+            return np.clip(img, 0, 1)
+        np.clip(img, 0, 1, out=img)
         return img
 
-    def get_segmentation_mask(self, scene, img_id, K):
-        tmp_file_path = f'{self.tmp_file_path}/segmentation0001.exr'
-        out_data = bpy.data.images.load(tmp_file_path)
-        pixels_numpy = np.array(out_data.pixels[:])
-        res_x = self.resolution_x
-        res_y = self.resolution_y
-        # Numpy works with (y, x, channels)
-        pixels_numpy.resize((res_y, res_x, 4))
-        # flip vertically (in Blender y in the image points up instead of down)
-        pixels_numpy = np.flip(pixels_numpy, 0)
-        mask = pixels_numpy[:, :, 0].astype(np.uint8)
-        os.remove(tmp_file_path)
+    def get_segmentation_mask(self, scene, img_id, K, passes=None,
+                              dtype=np.uint16):
+        """
+        Object ids from the IndexOB pass. dtype=None picks uint16 or uint32
+        from the largest id; ids that overflow dtype raise.
+        """
+        if passes is None:
+            passes = self.read_render_passes(scene)
+        mask = index_to_mask(passes['IndexOB'], dtype)
         return mask
 
-    def get_depth(self, scene, img_id, K):
+    def get_depth(self, scene, img_id, K, depth_type='planar', passes=None):
         """
         Taken from vision blender
+
+        depth_type is one of 'planar' (Z along the optical axis), 'ray'
+        (distance from the camera centre, as stored by Blender) or
+        'disparity' (1 / Z normalised to [0, 1]).
         """
-        tmp_file_path = f'{self.tmp_file_path}/depth0001.exr'
-        out_data = bpy.data.images.load(tmp_file_path)
-        pixels_numpy = np.array(out_data.pixels[:])
-        res_x = self.resolution_x
-        res_y = self.resolution_y
-        # Numpy works with (y, x, channels)
-        pixels_numpy.resize((res_y, res_x, 4))
-        # flip vertically (in Blender y in the image points up instead of down)
-        pixels_numpy = np.flip(pixels_numpy, 0)
-
-        z = pixels_numpy[:, :, 0]
-        # Points at infinity get a -1 value
+        if passes is None:
+            passes = self.read_render_passes(scene)
+        z = passes['Depth']
         max_dist = scene.camera.data.clip_end
-        INVALID_POINT = -1.0
-        z[z > max_dist] = INVALID_POINT
-        f_x = K[0][0]
-        f_y = K[1][1]
-        c_x = K[0][2]
-        c_y = K[1][2]
-
-        for y in range(res_y):
-            b = ((c_y - y) / f_y)
-            for x in range(res_x):
-                val = z[y][x]
-                if val != INVALID_POINT:
-                    a = ((c_x - x) / f_x)
-                    z[y][x] = val / np.linalg.norm([1, a, b])
-        os.remove(tmp_file_path)
-        return z
+        return convert_depth(z, K, max_dist, depth_type)
 
 
 class Object:
@@ -260,6 +509,11 @@ class Object:
         else:
             self.obj.hide_render = False
 
+    def shade_flat(self, flat=True):
+        polygons = self.obj.data.polygons
+        polygons.foreach_set('use_smooth', np.full(len(polygons), not flat))
+        self.obj.data.update()
+
     def link_material(self, mat):
         if self.obj.data.materials:
             self.obj.data.materials[0] = mat
@@ -282,33 +536,166 @@ class Object:
         self.obj.keyframe_delete(data_path=data_path, frame=frame)
 
     def uv_parameterize(self, type):
+        # Smart UV project has no bpy.data equivalent, so it stays an
+        # operator, run on this object regardless of the current selection
         if type == 'smart_uv':
-            if self.mode != 'EDIT':
+            view_layer = bpy.context.view_layer
+            for obj in bpy.context.selected_objects:
+                obj.select_set(False)
+            self.obj.select_set(True)
+            view_layer.objects.active = self.obj
+            if self.obj.mode != 'EDIT':
                 bpy.ops.object.mode_set(mode='EDIT')
 
             bpy.ops.uv.smart_project()
             bpy.ops.object.mode_set(mode='OBJECT')
 
-    def save_mesh(self, path, materials=True, uv=True):
+    def update_geometry(self, filepath=None, data=None, cache_dir=None,
+                        recenter=True):
+        """
+        Reuse this object's mesh for a new file or read_mesh dict instead of
+        creating a new object. Vertex positions, UVs, colours and normals are
+        overwritten in place; topology is rebuilt only if the vertex or face
+        counts changed. With recenter the geometry median is moved to the
+        object origin, as add_objects does. Returns True if rebuilt.
+        """
+        if data is None:
+            data = read_mesh(filepath, cache_dir=cache_dir)
+        if recenter and len(data['vertices']):
+            data = dict(data)
+            data['vertices'] = data['vertices'] - data['vertices'].mean(axis=0)
+        return update_mesh(self.obj.data, data)
+
+    def save_mesh(self, path, materials=True, uv=True, evaluated=False,
+                  world_space=False, attributes=()):
+        """
+        .ply and .npz are written straight from foreach_get arrays, with
+        modifiers applied if evaluated and the mesh attributes named in
+        attributes included; .obj goes through Blender's exporter. materials
+        only applies to .obj, the array formats carry no materials.
+        """
+        if os.path.splitext(path)[1].lower() in MESH_WRITERS:
+            data = object_arrays(self.obj, evaluated=evaluated,
+                                 world_space=world_space, uvs=uv,
+                                 attributes=attributes)
+            return write_mesh(path, data)
         bpy.ops.wm.obj_export(filepath=path, export_materials=materials,
                               export_uv=uv, )
 
 
+def _new_group_socket(group, name, socket_type, in_out):
+    # Blender 4.0 moved group sockets to group.interface
+    if hasattr(group, 'interface'):
+        return group.interface.new_socket(name, in_out=in_out,
+                                          socket_type=socket_type)
+    sockets = group.inputs if in_out == 'INPUT' else group.outputs
+    return sockets.new(socket_type, name)
+
+
+def _group_input_identifier(group, name):
+    if hasattr(group, 'interface'):
+        for item in group.interface.items_tree:
+            if (item.item_type == 'SOCKET' and item.in_out == 'INPUT'
+                    and item.name == name):
+                return item.identifier
+        raise KeyError(name)
+    return group.inputs[name].identifier
+
+
+def point_cloud_node_group():
+    """
+    Geometry-nodes group turning a mesh's vertices into render points with
+    a 'Radius' and 'Material' input. Created once and shared by every
+    PointCloud; vertex attributes such as 'Col' are carried to the points.
+    """
+    group = bpy.data.node_groups.get(POINT_CLOUD_NODE_GROUP)
+    if group is not None:
+        return group
+
+    group = bpy.data.node_groups.new(POINT_CLOUD_NODE_GROUP, 'GeometryNodeTree')
+    group.use_fake_user = True
+    _new_group_socket(group, 'Geometry', 'NodeSocketGeometry', 'INPUT')
+    _new_group_socket(group, 'Radius', 'NodeSocketFloat', 'INPUT')
+    _new_group_socket(group, 'Material', 'NodeSocketMaterial', 'INPUT')
+    _new_group_socket(group, 'Geometry', 'NodeSocketGeometry', 'OUTPUT')
+
+    group_input = group.nodes.new('NodeGroupInput')
+    group_output = group.nodes.new('NodeGroupOutput')
+    to_points = group.nodes.new('GeometryNodeMeshToPoints')
+    set_material = group.nodes.new('GeometryNodeSetMaterial')
+    group.links.new(group_input.outputs['Geometry'], to_points.inputs['Mesh'])
+    group.links.new(group_input.outputs['Radius'], to_points.inputs['Radius'])
+    group.links.new(to_points.outputs['Points'], set_material.inputs['Geometry'])
+    group.links.new(group_input.outputs['Material'],
+                    set_material.inputs['Material'])
+    group.links.new(set_material.outputs['Geometry'],
+                    group_output.inputs['Geometry'])
+    return group
+
+
+class PointCloud(Object):
+    """
+    A vertex-only mesh rendered as points through point_cloud_node_group.
+    The object, mesh and modifier are created once; load() swaps the points
+    in place, so a sequence of clouds renders without recreating anything.
+    Vertex colours are stored in the 'Col' attribute for shaders to read.
+    """
+    def __init__(self, name='point_cloud', radius=0.005, material=None):
+        obj = bpy.data.objects.get(name)
+        if obj is None:
+            obj = bpy.data.objects.new(name, bpy.data.meshes.new(name))
+            bpy.context.collection.objects.link(obj)
+        super().__init__(obj_name=obj.name)
+
+        self.modifier = self.obj.modifiers.get(POINT_CLOUD_MODIFIER)
+        if self.modifier is None:
+            self.modifier = self.obj.modifiers.new(POINT_CLOUD_MODIFIER, 'NODES')
+        self.modifier.node_group = point_cloud_node_group()
+        self.set_radius(radius)
+        if material is not None:
+            self.link_material(material)
+
+    def _set_input(self, name, value):
+        identifier = _group_input_identifier(self.modifier.node_group, name)
+        self.modifier[identifier] = value
+        self.obj.update_tag()
+
+    def set_radius(self, radius):
+        self._set_input('Radius', float(radius))
+
+    def link_material(self, mat):
+        if isinstance(mat, str):
+            mat = bpy.data.materials[mat]
+        self._set_input('Material', mat)
+
+    def load(self, filepath=None, data=None, cache_dir=None, recenter=True):
+        """
+        Replace the points with a PLY/OBJ file or a read_mesh dict. With
+        recenter the points are centred on the object origin, as
+        add_objects does. Returns True if the vertex count changed.
+        """
+        if data is None:
+            data = read_mesh(filepath, cache_dir=cache_dir)
+        if recenter and len(data['vertices']):
+            data = dict(data)
+            data['vertices'] = data['vertices'] - data['vertices'].mean(axis=0)
+        return update_points(self.obj.data, data)
+
+
 class Shaders:
     def __init__(self, name):
         self.mat = self.material(mat_name=name)
-        self.node_names = [node.name for node in self.mat.node_tree.nodes]
         self.nodes = self.mat.node_tree.nodes
         self.links = self.mat.node_tree.links
+        self.node_names = {node.name: node for node in self.nodes}
 
-    def get_node(self, node_name):
-        if node_name in self.node_names:
-            return self.nodes[node_name]
-        else:
-            shader_node_type = str(SHADER_NODE_TYPE[node_name])
-            self.node_names.append(node_name)
+    def get_node(self, node_name, node_type=None):
+        node = self.node_names.get(node_name)
+        if node is None:
+            shader_node_type = str(node_type or SHADER_NODE_TYPE[node_name])
             node = self.nodes.new(type=shader_node_type)
             node.name = node_name
+            self.node_names[node_name] = node
         return node
 
     def get_link(self, socket_name):
@@ -316,6 +703,14 @@ class Shaders:
             if link.to_socket.name == socket_name:
                 return link
 
+    def link(self, from_socket, to_socket):
+        """Like links.new, but keeps an identical existing link"""
+        if to_socket.is_linked:
+            link = to_socket.links[0]
+            if link.from_socket == from_socket:
+                return link
+        return self.links.new(from_socket, to_socket)
+
     def remove_link(self, link):
         self.links.remove(link)
 
@@ -323,38 +718,187 @@ class Shaders:
         mat = bpy.data.materials.get(mat_name)
         if mat is None:
             mat = bpy.data.materials.new(name=mat_name)
-        mat.use_nodes = True
+        if not mat.use_nodes:
+            mat.use_nodes = True
         if reset:
             if mat.node_tree:
                 mat.node_tree.links.clear()
                 mat.node_tree.nodes.clear()
+            if TEMPLATE_HASH_KEY in mat:
+                del mat[TEMPLATE_HASH_KEY]
         return mat
 
     def change_node_name(self, node, tar_name):
         cur_name = node.name
         self.nodes[cur_name].name = tar_name
-        self.node_names.remove(cur_name)
-        self.node_names.append(tar_name)
+        self.node_names[tar_name] = self.node_names.pop(cur_name, node)
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return sorted((str(k), _canonical(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def _same_value(value, live):
+    """Template value equal to a live RNA value, arrays compared per item"""
+    if isinstance(value, (list, tuple)):
+        value = tuple(value)
+        try:
+            live = tuple(live)
+        except TypeError:
+            return False
+    return _same(value, live)
+
+
+class MaterialTemplate:
+    """
+    A shader node graph declared once and applied to materials by hash.
+
+    nodes maps node names to node types for nodes the template creates,
+    inputs and properties map node names to {input: default_value} and
+    {attribute: value}, and links is a list of
+    (from_node, from_output, to_node, to_input). Nodes only referenced in
+    inputs, properties or links must already exist in the material or be
+    keys of SHADER_NODE_TYPE.
+
+    Applying records the template hash on the material. A material counts
+    as applied when it carries the hash and its live graph still holds every
+    node type, input value, property and link the template sets, so
+    re-applying an unchanged template is a no-op and Cycles does not
+    recompile the shader, while edits made since are written back.
+    """
+    def __init__(self, name, nodes=None, inputs=None, properties=None,
+                 links=None):
+        self.name = name
+        self.nodes = nodes or {}
+        self.inputs = inputs or {}
+        self.properties = properties or {}
+        self.links = links or []
+        spec = [self.nodes, self.inputs, self.properties, self.links]
+        self.hash = hashlib.sha1(
+            json.dumps(_canonical(spec), default=repr).encode()).hexdigest()
+
+    def is_applied(self, mat):
+        if mat.get(TEMPLATE_HASH_KEY) != self.hash or not mat.use_nodes:
+            return False
+        nodes = mat.node_tree.nodes
+        for node_name, node_type in self.nodes.items():
+            node = nodes.get(node_name)
+            if node is None or node.bl_idname != str(node_type):
+                return False
+        for node_name, values in self.inputs.items():
+            node = nodes.get(node_name)
+            if node is None or not all(
+                    _same_value(value, node.inputs[socket].default_value)
+                    for socket, value in values.items()):
+                return False
+        for node_name, values in self.properties.items():
+            node = nodes.get(node_name)
+            if node is None or not all(
+                    _same_value(value, getattr(node, attr))
+                    for attr, value in values.items()):
+                return False
+        for from_node, from_output, to_node, to_input in self.links:
+            if from_node not in nodes or to_node not in nodes:
+                return False
+            to_socket = nodes[to_node].inputs[to_input]
+            if not to_socket.is_linked or (
+                    to_socket.links[0].from_socket
+                    != nodes[from_node].outputs[from_output]):
+                return False
+        return True
+
+    def apply(self, mat_name):
+        """
+        Build the template into the material (created if needed) and return
+        it. Nothing is touched when the material is already applied.
+        """
+        mat = bpy.data.materials.get(mat_name)
+        if mat is not None and self.is_applied(mat):
+            return mat
+
+        shader = Shaders(mat_name)
+        for node_name, node_type in self.nodes.items():
+            shader.get_node(node_name, node_type)
+        for node_name, values in self.inputs.items():
+            node = shader.get_node(node_name)
+            for socket, value in values.items():
+                node.inputs[socket].default_value = value
+        for node_name, values in self.properties.items():
+            node = shader.get_node(node_name)
+            for attr, value in values.items():
+                setattr(node, attr, value)
+        for from_node, from_output, to_node, to_input in self.links:
+            shader.link(shader.get_node(from_node).outputs[from_output],
+                        shader.get_node(to_node).inputs[to_input])
+
+        shader.mat[TEMPLATE_HASH_KEY] = self.hash
+        return shader.mat
+
+    def shared_material(self):
+        """
+        One material per template, shared by every object using it instead
+        of a copy per object.
+        """
+        return self.apply(f'{self.name}.{self.hash[:8]}')
+
+
+def _fcurves(id_data):
+    """
+    F-curves animating id_data, or None when its animation cannot be
+    evaluated from them alone (drivers, NLA).
+    """
+    anim = id_data.animation_data
+    if anim is None:
+        return []
+    if len(anim.drivers) or len(anim.nla_tracks):
+        return None
+    action = anim.action
+    if action is None:
+        return []
+    fcurves = getattr(action, 'fcurves', None)
+    if fcurves is None:
+        # Slotted actions in newer Blender
+        try:
+            from bpy_extras.anim_utils import action_get_channelbag_for_slot
+        except ImportError:
+            return None
+        channelbag = action_get_channelbag_for_slot(action, anim.action_slot)
+        fcurves = channelbag.fcurves if channelbag is not None else []
+    return fcurves
+
+
+def _evaluate_channels(id_data, fcurves, data_path, frames):
+    """(N, C) values of id_data.data_path with animated channels evaluated"""
+    base = np.atleast_1d(np.array(getattr(id_data, data_path), dtype=np.float64))
+    values = np.tile(base, (len(frames), 1))
+    for fcurve in fcurves:
+        if fcurve.data_path == data_path:
+            values[:, fcurve.array_index] = [fcurve.evaluate(frame)
+                                             for frame in frames]
+    return values
 
 
 class Camera:
     def __init__(self, name=None):
-        if name:
-            self.name = name
+        self.name = name
+        if name and name in bpy.data.objects:
             self.camera = bpy.data.objects[self.name]
         else:
             self.add_camera()
 
     def add_camera(self,  matrix=None, lens=None):
-        bpy.ops.object.camera_add(enter_editmode=False, align="WORLD")
-
+        name = self.name or 'Camera'
+        cam_data = bpy.data.cameras.new(name)
         if lens:
-            bpy.context.object.data.lens = lens
+            cam_data.lens = lens
 
-        cam = bpy.data.objects['Camera']
-
-        if self.name:
-            cam.name = self.name
+        cam = bpy.data.objects.new(name, cam_data)
+        bpy.context.collection.objects.link(cam)
+        self.name = cam.name
 
         if matrix:
             cam.matrix_world = Matrix(matrix)
@@ -362,63 +906,13 @@ class Camera:
         self.camera = cam
 
     def get_intrinsic_camera_parameters(self, scene):
-        focal_length = scene.camera.data.lens
-        resolution_scale = (scene.render.resolution_percentage / 100.0)
-        resolution_x = scene.render.resolution_x * resolution_scale  # [pixels]
-        resolution_y = scene.render.resolution_y * resolution_scale  # [pixels]
-        res_x = int(resolution_x)
-        res_y = int(resolution_y)
-
-        cam_data = scene.camera.data
-        if cam_data.sensor_fit == 'VERTICAL':
-            sensor_size_in_mm = cam_data.sensor_height
-        else:
-            sensor_size_in_mm = cam_data.sensor_width
-
-        if cam_data.sensor_fit == 'AUTO':
-
-            size_x = scene.render.pixel_aspect_x * res_x
-            size_y = scene.render.pixel_aspect_y * res_y
-
-            if size_x >= size_y:
-                sensor_fit = 'HORIZONTAL'
-            else:
-                sensor_fit = 'VERTICAL'
-
-        pixel_aspect_ratio = scene.render.pixel_aspect_y / scene.render.pixel_aspect_x
-        if sensor_fit == 'HORIZONTAL':
-            view_fac_in_px = res_x
-        else:
-            view_fac_in_px = pixel_aspect_ratio * res_y
-        pixel_size_mm_per_px = (
-            sensor_size_in_mm / focal_length) / view_fac_in_px
-        f_x = 1.0 / pixel_size_mm_per_px
-        f_y = (1.0 / pixel_size_mm_per_px) / pixel_aspect_ratio
-        c_x = (res_x - 1) / 2.0 - cam_data.shift_x * view_fac_in_px
-        c_y = (res_y - 1) / 2.0 + (cam_data.shift_y *
-                                   view_fac_in_px) / pixel_aspect_ratio
-        K = [[f_x, 0, c_x],
-             [0, f_y, c_y],
-             [0,  0,   1]]
-        return K
+        K = camera_model.intrinsics_from_settings(scene.camera.data,
+                                                  scene.render)[0]
+        return K.tolist()
 
     def get_extrinsic_camera_parameters(self, scene):
-        bcam = scene.camera
-        R_bcam2cv = np.array([[1,  0,  0],
-                              [0, -1,  0],
-                              [0,  0, -1]])
-
-        location = np.array([bcam.matrix_world.decompose()[0]]).T
-        RT_blender = np.array(bcam.matrix_world)
-        R_world2bcam = np.array(bcam.matrix_world.decompose()[
-                                1].to_matrix().transposed())
-
-        T_world2bcam = np.matmul(R_world2bcam.dot(-1), location)
-
-        R_world2cv = np.matmul(R_bcam2cv, R_world2bcam)
-        T_world2cv = np.matmul(R_bcam2cv, T_world2bcam)
-
-        extr = np.concatenate((R_world2cv, T_world2cv), axis=1)
+        RT_blender = np.array(scene.camera.matrix_world)
+        extr = camera_model.extrinsics(RT_blender)[0]
         return RT_blender, extr
 
     def get_camera_parameters(self, scene):
@@ -426,4 +920,121 @@ class Camera:
         K = self.get_intrinsic_camera_parameters(scene)
         RT_blender, RT_cv = self.get_extrinsic_camera_parameters(scene)
         P = np.matmul(K, RT_cv)
-        return P, K, RT_cv, RT_blender
\ No newline at end of file
+        return P, K, RT_cv, RT_blender
+
+    def orbit(self, scene, target, radius, elevation, n_views, start_frame=1,
+              start_angle=0.0):
+        """
+        Key the camera on a circular orbit around target looking at it, one
+        view per frame, and set the scene frame range so a single
+        Scene.render(animation=True) renders every view. Angles in radians.
+        Returns the list of keyed frames.
+        """
+        target = Vector(target)
+        cam = self.camera
+        cam.rotation_mode = 'XYZ'
+        frames = []
+        for i in range(n_views):
+            azimuth = start_angle + 2 * math.pi * i / n_views
+            offset = Vector((radius * math.cos(elevation) * math.cos(azimuth),
+                             radius * math.cos(elevation) * math.sin(azimuth),
+                             radius * math.sin(elevation)))
+            cam.location = target + offset
+            cam.rotation_euler = (-offset).to_track_quat('-Z', 'Y').to_euler(
+                'XYZ', cam.rotation_euler)
+            frame = start_frame + i
+            cam.keyframe_insert(data_path='location', frame=frame)
+            cam.keyframe_insert(data_path='rotation_euler', frame=frame)
+            frames.append(frame)
+
+        scene.camera = cam
+        scene.frame_start = start_frame
+        scene.frame_end = start_frame + n_views - 1
+        return frames
+
+    def get_camera_parameters_batch(self, scene, frames=None, cameras=None):
+        """
+        Stacked camera parameters either for this camera over frames or for
+        several cameras (objects or names) at the current frame. Returns a
+        dict with frames, P (N, 3, 4), K (N, 3, 3), RT_cv (N, 3, 4) and
+        RT_blender (N, 4, 4).
+
+        F-curves of cameras without parents, constraints, drivers or NLA are
+        evaluated directly; anything else falls back to one frame_set per
+        frame.
+        """
+        if cameras is not None:
+            cams = [bpy.data.objects[c] if isinstance(c, str) else c
+                    for c in cameras]
+            bpy.context.view_layer.update()
+            frames = np.full(len(cams), scene.frame_current)
+            matrix_world = np.array([np.array(c.matrix_world) for c in cams])
+            cam_data = {attr: np.array([getattr(c.data, attr) for c in cams])
+                        for attr in CAMERA_DATA_ATTRS}
+        else:
+            if frames is None:
+                frames = [scene.frame_current]
+            frames = np.asarray(list(frames))
+            matrix_world, cam_data = self._animated_parameters(frames)
+            if matrix_world is None:
+                matrix_world, cam_data = self._evaluated_parameters(scene, frames)
+
+        K = camera_model.intrinsics_from_settings(cam_data, scene.render)
+        RT_cv = camera_model.extrinsics(matrix_world)
+        return {'frames': frames,
+                'P': camera_model.projection(K, RT_cv),
+                'K': K,
+                'RT_cv': RT_cv,
+                'RT_blender': matrix_world}
+
+    def _animated_parameters(self, frames):
+        cam = self.camera
+        obj_fcurves = _fcurves(cam)
+        data_fcurves = _fcurves(cam.data)
+        no_deltas = (not any(cam.delta_location)
+                     and not any(cam.delta_rotation_euler)
+                     and tuple(cam.delta_scale) == (1, 1, 1)
+                     and tuple(cam.delta_rotation_quaternion) == (1, 0, 0, 0))
+        if (cam.parent is not None or len(cam.constraints) or not no_deltas
+                or obj_fcurves is None or data_fcurves is None
+                or cam.rotation_mode == 'AXIS_ANGLE'):
+            return None, None
+
+        location = _evaluate_channels(cam, obj_fcurves, 'location', frames)
+        scale = _evaluate_channels(cam, obj_fcurves, 'scale', frames)
+        if cam.rotation_mode == 'QUATERNION':
+            rotation = camera_model.quaternion_to_matrix(_evaluate_channels(
+                cam, obj_fcurves, 'rotation_quaternion', frames))
+        else:
+            rotation = camera_model.euler_to_matrix(_evaluate_channels(
+                cam, obj_fcurves, 'rotation_euler', frames), cam.rotation_mode)
+        matrix_world = camera_model.compose_matrix_world(location, rotation, scale)
+
+        cam_data = {attr: _evaluate_channels(cam.data, data_fcurves, attr, frames)[:, 0]
+                    for attr in CAMERA_DATA_ATTRS if attr != 'sensor_fit'}
+        cam_data['sensor_fit'] = cam.data.sensor_fit
+        return matrix_world, cam_data
+
+    def _evaluated_parameters(self, scene, frames):
+        cam = self.camera
+        current_frame = scene.frame_current
+        matrix_world = []
+        cam_data = {attr: [] for attr in CAMERA_DATA_ATTRS}
+        for frame in frames:
+            scene.frame_set(int(frame))
+            matrix_world.append(np.array(cam.matrix_world))
+            for attr in CAMERA_DATA_ATTRS:
+                cam_data[attr].append(getattr(cam.data, attr))
+        scene.frame_set(current_frame)
+        return (np.array(matrix_world),
+                {attr: np.array(values) for attr, values in cam_data.items()})
+
+    def export_camera_parameters(self, scene, frames, path=None):
+        """
+        Stack P, K, RT_cv and RT_blender for every frame, optionally saved
+        to an .npz next to the rendered views.
+        """
+        params = self.get_camera_parameters_batch(scene, frames=frames)
+        if path is not None:
+            np.savez(path, **params)
+        return params
@@ -0,0 +1,170 @@
+import os
+import json
+import zipfile
+import threading
+import numpy as np
+
+
+INDEX_NAME = 'index.json'
+
+# Whether each channel is deflated inside the shard; others are stored
+DEFAULT_COMPRESSION = {
+    'rgb': True,
+    'mask': True,
+    'depth': True,
+    'camera': False,
+}
+
+
+def _write_index(root, index):
+    path = os.path.join(root, INDEX_NAME)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def _read_index(root):
+    path = os.path.join(root, INDEX_NAME)
+    if not os.path.exists(path):
+        return {'shards': [], 'frames': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+class ShardWriter:
+    """
+    Streams frames into fixed-size shards under root.
+
+    A shard is a zip of .npy members named '<frame_id>/<channel>.npy', so
+    it also opens with np.load, and each channel is deflated or stored as
+    set in compress. index.json maps frame ids to shards and is rewritten
+    whenever a shard is complete, so it never points at a partial shard;
+    reopening root appends new shards after the existing ones. write() may
+    be called from OutputPipeline workers.
+    """
+    def __init__(self, root, frames_per_shard=256, compress=None):
+        self.root = root
+        self.frames_per_shard = frames_per_shard
+        self.compress = dict(DEFAULT_COMPRESSION)
+        self.compress.update(compress or {})
+        os.makedirs(root, exist_ok=True)
+        self.index = _read_index(root)
+        self.shard = None
+        self.shard_name = None
+        self.shard_frames = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open_shard(self):
+        self.shard_name = f'shard-{len(self.index["shards"]):05d}.npz'
+        self.shard = zipfile.ZipFile(os.path.join(self.root, self.shard_name),
+                                     mode='w', allowZip64=True)
+        self.shard_frames = []
+
+    def _close_shard(self):
+        if self.shard is None:
+            return
+        self.shard.close()
+        self.index['shards'].append(self.shard_name)
+        for frame_id in self.shard_frames:
+            self.index['frames'][frame_id] = self.shard_name
+        _write_index(self.root, self.index)
+        self.shard = None
+
+    def _write_array(self, name, array, compress):
+        compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        info = zipfile.ZipInfo(name)
+        info.compress_type = compression
+        with self.shard.open(info, mode='w', force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(array),
+                                      allow_pickle=False)
+
+    def write(self, frame_id, rgb=None, mask=None, depth=None, camera=None,
+              **channels):
+        """
+        Append one frame. camera is a dict of matrices (e.g. K, RT_cv, P),
+        extra keyword arrays are stored as channels of their own.
+        """
+        with self.lock:
+            self._write(str(frame_id), rgb, mask, depth, camera, channels)
+
+    def _write(self, frame_id, rgb, mask, depth, camera, channels):
+        if '/' in frame_id:
+            raise ValueError(f'Frame id {frame_id} must not contain "/"')
+        if frame_id in self.index['frames'] or frame_id in self.shard_frames:
+            raise ValueError(f'Frame {frame_id} was already written')
+        if self.shard is None:
+            self._open_shard()
+
+        channels.update(rgb=rgb, mask=mask, depth=depth)
+        for channel, array in channels.items():
+            if array is not None:
+                self._write_array(f'{frame_id}/{channel}.npy', array,
+                                  self.compress.get(channel, True))
+        for key, array in (camera or {}).items():
+            self._write_array(f'{frame_id}/camera/{key}.npy', array,
+                              self.compress['camera'])
+
+        self.shard_frames.append(frame_id)
+        if len(self.shard_frames) >= self.frames_per_shard:
+            self._close_shard()
+
+    def close(self):
+        with self.lock:
+            self._close_shard()
+
+
+class ShardReader:
+    """
+    Random access to frames written by ShardWriter: reader[frame_id]
+    returns a dict of channel arrays, camera matrices as 'camera/K' etc.
+    """
+    def __init__(self, root, max_open=8):
+        self.root = root
+        self.max_open = max_open
+        self.index = _read_index(root)
+        self.open_shards = {}
+
+    def __len__(self):
+        return len(self.index['frames'])
+
+    def __contains__(self, frame_id):
+        return str(frame_id) in self.index['frames']
+
+    def __iter__(self):
+        return iter(self.index['frames'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _shard(self, name):
+        shard = self.open_shards.pop(name, None)
+        if shard is None:
+            if len(self.open_shards) >= self.max_open:
+                oldest = next(iter(self.open_shards))
+                self.open_shards.pop(oldest).close()
+            shard = np.load(os.path.join(self.root, name))
+        # Most recently used last
+        self.open_shards[name] = shard
+        return shard
+
+    def __getitem__(self, frame_id):
+        frame_id = str(frame_id)
+        shard = self._shard(self.index['frames'][frame_id])
+        prefix = f'{frame_id}/'
+        return {key[len(prefix):]: shard[key] for key in shard.files
+                if key.startswith(prefix)}
+
+    def close(self):
+        for shard in self.open_shards.values():
+            shard.close()
+        self.open_shards.clear()
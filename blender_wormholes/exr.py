@@ -0,0 +1,208 @@
+import struct
+import zlib
+import numpy as np
+
+try:
+    import OpenEXR
+except ImportError:
+    OpenEXR = None
+
+
+EXR_MAGIC = 20000630
+
+# Blender's exr_codec names -> OpenEXR compression ids
+EXR_CODECS = {
+    'NONE': 0,
+    'RLE': 1,
+    'ZIPS': 2,
+    'ZIP': 3,
+    'PIZ': 4,
+    'PXR24': 5,
+    'B44': 6,
+    'B44A': 7,
+    'DWAA': 8,
+    'DWAB': 9,
+}
+
+# Codecs decoded here without OpenEXR, with their scanlines per block
+NATIVE_CODECS = {0: 1, 1: 1, 2: 1, 3: 16}
+
+PIXEL_TYPES = {0: np.dtype('<u4'), 1: np.dtype('<f2'), 2: np.dtype('<f4')}
+
+CHANNEL_ORDER = ('R', 'G', 'B', 'A', 'X', 'Y', 'Z', 'W', 'V')
+
+
+def _read_cstr(data, pos):
+    end = data.index(b'\0', pos)
+    return data[pos:end].decode(), end + 1
+
+
+def _parse_channels(value):
+    channels = []
+    pos = 0
+    while value[pos] != 0:
+        name, pos = _read_cstr(value, pos)
+        pixel_type, _, x_sampling, y_sampling = struct.unpack_from(
+            '<i4sii', value, pos)
+        pos += 16
+        channels.append((name, pixel_type))
+    return channels
+
+
+def read_header(data):
+    """
+    Parse the header of a single-part scanline EXR held in memory.
+    Returns (header dict, offset of the line offset table).
+    """
+    magic, version = struct.unpack_from('<ii', data, 0)
+    if magic != EXR_MAGIC:
+        raise ValueError('Not an OpenEXR file')
+    if version & 0x1200:
+        raise ValueError('Tiled and multi-part EXR files are not supported')
+
+    header = {}
+    pos = 8
+    while data[pos] != 0:
+        name, pos = _read_cstr(data, pos)
+        _, pos = _read_cstr(data, pos)
+        size, = struct.unpack_from('<i', data, pos)
+        pos += 4
+        value = data[pos:pos + size]
+        pos += size
+        if name == 'channels':
+            header['channels'] = _parse_channels(value)
+        elif name == 'compression':
+            header['compression'] = value[0]
+        elif name == 'dataWindow':
+            header['dataWindow'] = struct.unpack('<iiii', value)
+    return header, pos + 1
+
+
+def _unpredict(raw):
+    """Undo the byte delta predictor and interleaving of ZIP/RLE blocks"""
+    t = np.frombuffer(raw, dtype=np.uint8).copy()
+    t[1:] -= 128
+    t = np.cumsum(t, dtype=np.uint8)
+    out = np.empty_like(t)
+    half = (len(t) + 1) // 2
+    out[0::2] = t[:half]
+    out[1::2] = t[half:]
+    return out
+
+
+def _rle_decompress(data):
+    out = bytearray()
+    pos = 0
+    while pos < len(data):
+        count = struct.unpack_from('<b', data, pos)[0]
+        pos += 1
+        if count < 0:
+            out += data[pos:pos - count]
+            pos -= count
+        else:
+            out += data[pos:pos + 1] * (count + 1)
+            pos += 1
+    return bytes(out)
+
+
+def _decompress(compression, data, raw_size):
+    # Blocks that do not shrink are stored as they are
+    if compression == 0 or len(data) == raw_size:
+        return np.frombuffer(data, dtype=np.uint8)
+    if compression == 1:
+        return _unpredict(_rle_decompress(data))
+    return _unpredict(zlib.decompress(data))
+
+
+def _group_layers(channels):
+    """Group 'Layer.C' channel arrays into (H, W) or (H, W, C) layers"""
+    grouped = {}
+    for name, pixels in channels.items():
+        layer, _, chan = name.rpartition('.')
+        layer = layer.rpartition('.')[2] or chan
+        grouped.setdefault(layer, []).append((chan, pixels))
+
+    layers = {}
+    for layer, chans in grouped.items():
+        chans.sort(key=lambda c: CHANNEL_ORDER.index(c[0])
+                   if c[0] in CHANNEL_ORDER else len(CHANNEL_ORDER))
+        if len(chans) == 1:
+            layers[layer] = chans[0][1]
+        else:
+            layers[layer] = np.stack([c[1] for c in chans], axis=-1)
+    return layers
+
+
+def _read_channels_native(data, header, names=None):
+    x_min, y_min, x_max, y_max = header['dataWindow']
+    width = x_max - x_min + 1
+    height = y_max - y_min + 1
+    compression = header['compression']
+    lines_per_block = NATIVE_CODECS[compression]
+    channels = header['channels']
+    line_bytes = sum(width * PIXEL_TYPES[t].itemsize for _, t in channels)
+
+    n_blocks = (height + lines_per_block - 1) // lines_per_block
+    _, table_pos = read_header(data)
+    offsets = np.frombuffer(data, dtype='<u8', count=n_blocks,
+                            offset=table_pos)
+
+    pixels = np.empty((height, line_bytes), dtype=np.uint8)
+    for offset in offsets:
+        y, size = struct.unpack_from('<ii', data, offset)
+        row = y - y_min
+        n_lines = min(lines_per_block, height - row)
+        block = data[offset + 8:offset + 8 + size]
+        pixels[row:row + n_lines] = _decompress(
+            compression, block, n_lines * line_bytes).reshape(n_lines, -1)
+
+    out = {}
+    col = 0
+    for name, pixel_type in channels:
+        dtype = PIXEL_TYPES[pixel_type]
+        n_bytes = width * dtype.itemsize
+        if names is None or name in names:
+            out[name] = pixels[:, col:col + n_bytes].copy().view(dtype)
+        col += n_bytes
+    return out
+
+
+def _read_channels_openexr(path, names=None):
+    if OpenEXR is None:
+        raise ImportError('Decoding this EXR codec needs the OpenEXR '
+                          'package, or use one of NONE, RLE, ZIPS, ZIP')
+    with OpenEXR.File(path, separate_channels=True) as exr_file:
+        channels = exr_file.channels()
+        return {name: np.asarray(channel.pixels)
+                for name, channel in channels.items()
+                if names is None or name in names}
+
+
+def read_exr(path, layers=None, dtype=np.float32):
+    """
+    Decode every layer of a (multilayer) EXR into NumPy in one pass.
+
+    Returns a dict mapping layer names (e.g. 'Depth', 'IndexOB', 'Normal')
+    to arrays of shape (H, W) for single channel layers and (H, W, C)
+    otherwise, top row first.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    header, _ = read_header(data)
+
+    names = None
+    if layers is not None:
+        layers = set(layers)
+        names = {name for name, _ in header['channels']
+                 if name.rpartition('.')[0].rpartition('.')[2] in layers
+                 or name in layers}
+
+    if header['compression'] in NATIVE_CODECS:
+        channels = _read_channels_native(data, header, names)
+    else:
+        channels = _read_channels_openexr(path, names)
+
+    if dtype is not None:
+        channels = {name: pixels.astype(dtype, copy=False)
+                    for name, pixels in channels.items()}
+    return _group_layers(channels)
@@ -0,0 +1,117 @@
+import os
+import bpy
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def image_nbytes(image):
+    width, height = image.size
+    return width * height * image.channels * (4 if image.is_float else 1)
+
+
+def _read_file(path, chunk_size=1 << 22):
+    # Only warms the OS page cache, bpy itself is not thread safe
+    with open(path, 'rb') as f:
+        while f.read(chunk_size):
+            pass
+    return path
+
+
+class ImageCache:
+    """
+    LRU cache of bpy.data.images keyed by path and modification time.
+
+    Images beyond max_bytes or max_count are removed from bpy.data.images,
+    least recently used first. Images still used by a node or material are
+    skipped until they are released.
+    """
+    def __init__(self, max_bytes=None, max_count=None, prefetch_workers=1):
+        self.max_bytes = max_bytes
+        self.max_count = max_count
+        self.images = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetch_workers = prefetch_workers
+        self.executor = None
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        entry = self.images.get(path)
+        if entry is not None:
+            image, entry_mtime, nbytes = entry
+            if entry_mtime == mtime and self._valid(image):
+                self.images.move_to_end(path)
+                self.hits += 1
+                return image
+            self._remove(path)
+
+        self.misses += 1
+        image = bpy.data.images.load(path, check_existing=False)
+        nbytes = image_nbytes(image)
+        self.images[path] = (image, mtime, nbytes)
+        self.nbytes += nbytes
+        self._evict(keep=path)
+        return image
+
+    def prefetch(self, paths):
+        """
+        Read the next texture files in the background so the following
+        get() calls do not wait on the disk.
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.prefetch_workers)
+        return [self.executor.submit(_read_file, os.path.abspath(path))
+                for path in paths if os.path.abspath(path) not in self.images]
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'count': len(self.images),
+            'bytes': self.nbytes,
+        }
+
+    def clear(self):
+        for path in list(self.images):
+            self._remove(path)
+
+    def close(self):
+        self.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _valid(self, image):
+        try:
+            image.name
+        except ReferenceError:
+            return False
+        return True
+
+    def _over_budget(self):
+        if self.max_count is not None and len(self.images) > self.max_count:
+            return True
+        return self.max_bytes is not None and self.nbytes > self.max_bytes
+
+    def _remove(self, path):
+        image, _, nbytes = self.images.pop(path)
+        self.nbytes -= nbytes
+        if self._valid(image):
+            bpy.data.images.remove(image)
+
+    def _evict(self, keep):
+        for path in list(self.images):
+            if not self._over_budget():
+                break
+            if path == keep:
+                continue
+            image = self.images[path][0]
+            if self._valid(image) and image.users > 0:
+                continue
+            self._remove(path)
+            self.evictions += 1
@@ -0,0 +1,177 @@
+import os
+import bpy
+import math
+import tempfile
+import numpy as np
+from mathutils import Euler, Vector
+from .constants import CAMERA_DATA_ATTRS, PASS_PROPERTIES
+from .core import Camera, convert_depth, index_to_mask
+
+
+# bpy.data collections whose new datablocks are removed after every job
+SNAPSHOT_COLLECTIONS = ('objects', 'meshes', 'curves', 'materials', 'images',
+                        'textures', 'node_groups', 'cameras', 'lights')
+
+# Job output -> render pass it needs
+OUTPUT_PASSES = {
+    'depth': 'Depth',
+    'mask': 'IndexOB',
+}
+
+
+class SceneSnapshot:
+    """
+    State of the base scene a warm worker resets to after every job: new
+    datablocks and compositor nodes are removed and the active camera
+    (transform and lens), render path, seed, samples, render passes,
+    compositor toggle and frame are restored. Other edits a job makes to
+    datablocks that already existed are not undone.
+    """
+    def __init__(self, sc):
+        self.sc = sc
+        scene = sc.scene
+        self.names = {collection: set(getattr(bpy.data, collection).keys())
+                      for collection in SNAPSHOT_COLLECTIONS}
+        self.camera = scene.camera
+        self.camera_matrix = None
+        self.camera_data = {}
+        if self.camera is not None:
+            self.camera_matrix = self.camera.matrix_world.copy()
+            self.camera_data = {attr: getattr(self.camera.data, attr)
+                                for attr in CAMERA_DATA_ATTRS}
+        self.overrides = {'output_path': scene.render.filepath,
+                          'seed': scene.cycles.seed,
+                          'samples': scene.cycles.samples}
+        self.frame = scene.frame_current
+        self.use_nodes = scene.use_nodes
+        self.nodes = (set(scene.node_tree.nodes.keys())
+                      if scene.node_tree is not None else set())
+        view_layer = bpy.context.view_layer
+        self.passes = {prop: getattr(view_layer, prop)
+                       for prop in PASS_PROPERTIES.values()}
+
+    def restore(self):
+        scene = self.sc.scene
+        # Objects first, so their data has no users left
+        for collection in SNAPSHOT_COLLECTIONS:
+            datablocks = getattr(bpy.data, collection)
+            for name in set(datablocks.keys()) - self.names[collection]:
+                datablocks.remove(datablocks[name])
+
+        scene.camera = self.camera
+        if self.camera is not None:
+            self.camera.matrix_world = self.camera_matrix
+            for attr, value in self.camera_data.items():
+                setattr(self.camera.data, attr, value)
+        self.sc.apply_config(**self.overrides)
+
+        if scene.node_tree is not None:
+            nodes = scene.node_tree.nodes
+            for name in set(nodes.keys()) - self.nodes:
+                nodes.remove(nodes[name])
+        scene.use_nodes = self.use_nodes
+        view_layer = bpy.context.view_layer
+        for prop, value in self.passes.items():
+            setattr(view_layer, prop, value)
+        if scene.frame_current != self.frame:
+            scene.frame_set(self.frame)
+
+
+def _apply_transform(obj, spec):
+    if 'location' in spec:
+        obj.location = spec['location']
+    if 'rotation' in spec:
+        obj.rotation_euler = Euler([math.radians(a) for a in spec['rotation']])
+    if 'scale' in spec:
+        scale = spec['scale']
+        obj.scale = (scale,) * 3 if isinstance(scale, (int, float)) else scale
+
+
+def _setup_camera(scene, spec):
+    if scene.camera is None:
+        scene.camera = Camera().camera
+    camera = scene.camera
+    _apply_transform(camera, spec)
+    if 'look_at' in spec:
+        direction = Vector(spec['look_at']) - camera.location
+        camera.rotation_euler = direction.to_track_quat('-Z', 'Y').to_euler()
+    for attr in CAMERA_DATA_ATTRS:
+        if attr in spec:
+            setattr(camera.data, attr, spec[attr])
+    return camera
+
+
+def render_job(sc, job):
+    """
+    Render one job spec:
+
+        {"mesh": "/abs/bunny.obj", "transform": {"location", "rotation"
+         (degrees), "scale"}, "material": "existing material",
+         "camera": {"location", "rotation" | "look_at", "lens", ...},
+         "samples": 64, "seed": 0, "depth_type": "planar",
+         "outputs": {"image": "/abs/out.png", "depth": "/abs/depth.npy",
+                     "mask": "/abs/mask.npy"}}
+
+    Every key is optional. Returns the written output paths plus the
+    camera's K and RT_cv.
+    """
+    scene = sc.scene
+    outputs = job.get('outputs', {})
+
+    if 'mesh' in job:
+        obj = sc.add_objects(job['mesh'], cache_dir=job.get('cache_dir'))
+        _apply_transform(obj.obj, job.get('transform', {}))
+        if 'material' in job:
+            obj.link_material(bpy.data.materials[job['material']])
+    camera = _setup_camera(scene, job.get('camera', {}))
+
+    if not getattr(sc, 'tmp_file_path', None):
+        sc.tmp_file_path = tempfile.mkdtemp(prefix='wh-')
+    image_path = outputs.get('image') or os.path.join(sc.tmp_file_path,
+                                                      'image.png')
+    sc.apply_config(output_path=image_path, seed=job.get('seed'),
+                    samples=job.get('samples'))
+
+    passes = [OUTPUT_PASSES[key] for key in OUTPUT_PASSES if key in outputs]
+    if passes:
+        # Added next to the base compositor tree, which the snapshot keeps
+        scene.use_nodes = True
+        sc.setup_composite_for_scene(scene, job.get('id', 'job'), passes,
+                                     clear=False)
+    sc.render()
+
+    _, K, RT_cv, _ = Camera(camera.name).get_camera_parameters(scene)
+    result = {'camera': {'K': np.asarray(K).tolist(), 'RT_cv': RT_cv.tolist()}}
+    if 'image' in outputs:
+        result['image'] = outputs['image']
+    if passes:
+        data = sc.read_render_passes(scene)
+        if 'depth' in outputs:
+            np.save(outputs['depth'], convert_depth(
+                data['Depth'], K, camera.data.clip_end,
+                job.get('depth_type', 'planar')))
+            result['depth'] = outputs['depth']
+        if 'mask' in outputs:
+            np.save(outputs['mask'], index_to_mask(data['IndexOB'], None))
+            result['mask'] = outputs['mask']
+    return result
+
+
+_snapshot = None
+
+
+def run_job(sc, job):
+    """
+    Worker callback for `wh serve`. The first call snapshots the freshly
+    loaded scene; every job then renders from that state and the scene is
+    reset afterwards, whether the job succeeded or not.
+    """
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = SceneSnapshot(sc)
+    if job.get('ping'):
+        return 'pong'
+    try:
+        return render_job(sc, job)
+    finally:
+        _snapshot.restore()
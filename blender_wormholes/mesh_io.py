@@ -0,0 +1,673 @@
+import os
+import hashlib
+import numpy as np
+
+
+# Bump when the cached array layout changes
+CACHE_VERSION = 2
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1',
+    'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2',
+    'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4',
+    'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4',
+    'double': 'f8', 'float64': 'f8',
+}
+
+PLY_BYTE_ORDER = {
+    'ascii': '=',
+    'binary_little_endian': '<',
+    'binary_big_endian': '>',
+}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _faces_from_lists(face_lists):
+    loop_totals = np.fromiter((len(f) for f in face_lists), dtype=np.int32,
+                              count=len(face_lists))
+    loop_vertices = np.fromiter((i for f in face_lists for i in f),
+                                dtype=np.int32, count=int(loop_totals.sum()))
+    return loop_vertices, loop_totals
+
+
+def read_mtl(path):
+    """
+    Diffuse colour ('Kd', with 'd' as alpha) and texture ('map_Kd') of
+    every material in a Wavefront MTL, as {name: {'color', 'texture'}}.
+    """
+    materials = {}
+    current = None
+    with open(path) as f:
+        for line in f:
+            parts = line.split(None, 1)
+            if not parts:
+                continue
+            tag, rest = parts[0], parts[1].strip() if len(parts) > 1 else ''
+            if tag == 'newmtl':
+                current = materials.setdefault(
+                    rest, {'color': [0.8, 0.8, 0.8, 1.0], 'texture': ''})
+            elif current is None:
+                continue
+            elif tag == 'Kd':
+                current['color'][:3] = [float(x) for x in rest.split()[:3]]
+            elif tag == 'd':
+                current['color'][3] = float(rest.split()[0])
+            elif tag == 'map_Kd' and rest:
+                # Options such as -s come first, the file name last
+                texture = rest.split()[-1]
+                current['texture'] = os.path.join(os.path.dirname(path),
+                                                  texture)
+    return materials
+
+
+def read_obj(path):
+    """
+    Parse a Wavefront OBJ into NumPy arrays, converting from OBJ's Y-up to
+    Blender's Z-up like the operator importer. Groups are ignored,
+    everything ends up in one mesh. usemtl materials are returned as
+    'material_names', 'material_colors', 'material_textures' (from the
+    mtllib files, when found) and per-face 'face_materials'.
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    v_lines, vt_lines, vn_lines, f_lines = [], [], [], []
+    by_tag = {'v': v_lines, 'vt': vt_lines, 'vn': vn_lines}
+    # Per face: v, vt and vn counts read so far and the usemtl in effect
+    f_counts, f_materials = [], []
+    materials, mtllibs = {}, []
+    material = 0
+    for line in lines:
+        parts = line.split(None, 1)
+        if not parts:
+            continue
+        tag = parts[0]
+        rest = parts[1] if len(parts) > 1 else ''
+        target = by_tag.get(tag)
+        if target is not None:
+            target.append(rest)
+        elif tag == 'f':
+            f_lines.append(rest)
+            f_counts.append((len(v_lines), len(vt_lines), len(vn_lines)))
+            f_materials.append(material)
+        elif tag == 'usemtl':
+            material = materials.setdefault(rest.strip(), len(materials))
+        elif tag == 'mtllib':
+            mtllibs.append(os.path.join(os.path.dirname(path), rest.strip()))
+
+    def to_array(rows, n_cols):
+        if not rows:
+            return np.zeros((0, n_cols), dtype=np.float32)
+        values = np.array(' '.join(rows).split(), dtype=np.float32)
+        return values.reshape(len(rows), -1)[:, :n_cols]
+
+    vertices = to_array(v_lines, 3)
+    uvs = to_array(vt_lines, 2)
+    normals = to_array(vn_lines, 3)
+
+    tokens = [face.split() for face in f_lines]
+    loop_totals = np.fromiter((len(t) for t in tokens), dtype=np.int32,
+                              count=len(tokens))
+    corners = [c for t in tokens for c in t]
+    if corners and '/' in corners[0]:
+        parts = [c.split('/') for c in corners]
+        v_idx = np.array([p[0] for p in parts], dtype=np.int64)
+        vt_idx = [p[1] if len(p) > 1 else '' for p in parts]
+        vn_idx = [p[2] if len(p) > 2 else '' for p in parts]
+    else:
+        v_idx = np.array(corners, dtype=np.int64)
+        vt_idx = vn_idx = []
+
+    # Counts read before each corner's face line
+    counts = np.repeat(np.array(f_counts, dtype=np.int64).reshape(-1, 3),
+                       loop_totals, axis=0)
+
+    def resolve(idx, count):
+        # OBJ indices are 1-based, negative ones count back from the
+        # elements read so far
+        return np.where(idx < 0, idx + count, idx - 1)
+
+    data = {
+        'vertices': vertices,
+        'loop_vertices': resolve(v_idx, counts[:, 0]).astype(np.int32),
+        'loop_totals': loop_totals,
+    }
+    if len(uvs) and vt_idx and all(vt_idx):
+        data['loop_uvs'] = uvs[resolve(np.array(vt_idx, dtype=np.int64),
+                                       counts[:, 1])]
+    if len(normals) and vn_idx and all(vn_idx):
+        loop_normals = normals[resolve(np.array(vn_idx, dtype=np.int64),
+                                       counts[:, 2])]
+        vertex_normals = np.zeros_like(vertices)
+        vertex_normals[data['loop_vertices']] = loop_normals
+        data['normals'] = vertex_normals
+
+    if materials:
+        library = {}
+        for mtllib in mtllibs:
+            if os.path.exists(mtllib):
+                library.update(read_mtl(mtllib))
+        default = {'color': [0.8, 0.8, 0.8, 1.0], 'texture': ''}
+        found = [library.get(name, default) for name in materials]
+        data['material_names'] = np.array(list(materials), dtype=str)
+        data['material_colors'] = np.array([m['color'] for m in found],
+                                           dtype=np.float32)
+        data['material_textures'] = np.array([m['texture'] for m in found],
+                                             dtype=str)
+        data['face_materials'] = np.array(f_materials, dtype=np.int32)
+
+    # OBJ is Y up, -Z forward
+    for key in ('vertices', 'normals'):
+        if key in data:
+            x, y, z = data[key].T
+            data[key] = np.stack((x, -z, y), axis=1)
+    return data
+
+
+def _read_ply_header(f):
+    if f.readline().strip() != b'ply':
+        raise ValueError('Not a PLY file')
+    fmt = None
+    elements = []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError('PLY header is not terminated')
+        words = line.decode('ascii').split()
+        if not words or words[0] in ('comment', 'obj_info'):
+            continue
+        if words[0] == 'end_header':
+            break
+        if words[0] == 'format':
+            fmt = words[1]
+        elif words[0] == 'element':
+            elements.append({'name': words[1], 'count': int(words[2]),
+                             'properties': []})
+        elif words[0] == 'property':
+            if words[1] == 'list':
+                prop = (words[4], PLY_TYPES[words[2]], PLY_TYPES[words[3]])
+            else:
+                prop = (words[2], PLY_TYPES[words[1]], None)
+            elements[-1]['properties'].append(prop)
+    if fmt not in PLY_BYTE_ORDER:
+        raise ValueError(f'Unknown PLY format {fmt}')
+    return fmt, elements
+
+
+def _read_ply_element_binary(buf, pos, element, order):
+    props = element['properties']
+    count = element['count']
+    if all(list_type is None for _, _, list_type in props):
+        dtype = np.dtype([(name, order + t) for name, t, _ in props])
+        values = np.frombuffer(buf, dtype=dtype, count=count, offset=pos)
+        return values, pos + dtype.itemsize * count
+
+    if len(props) != 1:
+        raise ValueError('Only single list properties are supported '
+                         f'for PLY element {element["name"]}')
+    name, count_type, index_type = props[0]
+    count_dtype = np.dtype(order + count_type)
+    index_dtype = np.dtype(order + index_type)
+    if count == 0:
+        return {name: []}, pos
+
+    # Fast path for meshes where every face has the same vertex count
+    first = int(np.frombuffer(buf, dtype=count_dtype, count=1, offset=pos)[0])
+    dtype = np.dtype([('n', count_dtype), ('idx', index_dtype, (first,))])
+    if pos + dtype.itemsize * count <= len(buf):
+        values = np.frombuffer(buf, dtype=dtype, count=count, offset=pos)
+        if np.all(values['n'] == first):
+            return {name: values['idx']}, pos + dtype.itemsize * count
+
+    lists = []
+    for _ in range(count):
+        n = int(np.frombuffer(buf, dtype=count_dtype, count=1, offset=pos)[0])
+        pos += count_dtype.itemsize
+        lists.append(np.frombuffer(buf, dtype=index_dtype, count=n, offset=pos))
+        pos += index_dtype.itemsize * n
+    return {name: lists}, pos
+
+
+def _read_ply_element_ascii(lines, pos, element):
+    props = element['properties']
+    count = element['count']
+    rows = lines[pos:pos + count]
+    if all(list_type is None for _, _, list_type in props):
+        values = np.array(b' '.join(rows).split(), dtype=np.float64)
+        values = values.reshape(count, len(props))
+        return {name: values[:, i].astype(t)
+                for i, (name, t, _) in enumerate(props)}, pos + count
+
+    name, _, index_type = props[0]
+    rows = [row.split() for row in rows]
+    if rows and all(len(row) == len(rows[0]) for row in rows):
+        values = np.array(rows, dtype=np.int64)[:, 1:1 + int(rows[0][0])]
+        return {name: values.astype(index_type)}, pos + count
+    return {name: [np.array(row[1:1 + int(row[0])], dtype=index_type)
+                   for row in rows]}, pos + count
+
+
+def read_ply(path):
+    """
+    Parse an ASCII or binary PLY into NumPy arrays. Vertex colours, normals
+    and per-vertex UVs are kept when present.
+    """
+    with open(path, 'rb') as f:
+        fmt, elements = _read_ply_header(f)
+        body = f.read()
+
+    order = PLY_BYTE_ORDER[fmt]
+    if fmt == 'ascii':
+        lines = [line for line in body.splitlines() if line.strip()]
+    parsed = {}
+    pos = 0
+    for element in elements:
+        if fmt == 'ascii':
+            values, pos = _read_ply_element_ascii(lines, pos, element)
+        else:
+            values, pos = _read_ply_element_binary(body, pos, element, order)
+        parsed[element['name']] = values
+
+    vertex = parsed['vertex']
+    names = vertex.dtype.names if hasattr(vertex, 'dtype') else tuple(vertex)
+
+    def columns(*keys):
+        return np.stack([np.asarray(vertex[k], dtype=np.float32)
+                         for k in keys], axis=1)
+
+    data = {'vertices': columns('x', 'y', 'z')}
+
+    faces = parsed.get('face', {})
+    face_lists = faces.get('vertex_indices', faces.get('vertex_index', []))
+    if isinstance(face_lists, np.ndarray):
+        data['loop_vertices'] = face_lists.astype(np.int32).ravel()
+        data['loop_totals'] = np.full(len(face_lists), face_lists.shape[1],
+                                      dtype=np.int32)
+    else:
+        data['loop_vertices'], data['loop_totals'] = _faces_from_lists(face_lists)
+
+    if {'nx', 'ny', 'nz'} <= set(names):
+        data['normals'] = columns('nx', 'ny', 'nz')
+    for u, v in (('s', 't'), ('u', 'v'), ('texture_u', 'texture_v')):
+        if {u, v} <= set(names):
+            data['loop_uvs'] = columns(u, v)[data['loop_vertices']]
+            break
+    if {'red', 'green', 'blue'} <= set(names):
+        keys = ['red', 'green', 'blue'] + (['alpha'] if 'alpha' in names else [])
+        colors = columns(*keys)
+        if np.asarray(vertex['red']).dtype.kind in 'iu':
+            colors /= 255.0
+        if colors.shape[1] == 3:
+            colors = np.concatenate(
+                (colors, np.ones((len(colors), 1), dtype=np.float32)), axis=1)
+        data['colors'] = colors
+    return data
+
+
+def read_npz(path):
+    with np.load(path) as data:
+        return dict(data)
+
+
+MESH_READERS = {
+    '.obj': read_obj,
+    '.ply': read_ply,
+    '.npz': read_npz,
+}
+
+
+def read_mesh(path, cache_dir=None):
+    """
+    Read an OBJ/PLY into a dict of arrays ('vertices', 'loop_vertices',
+    'loop_totals' and optionally 'loop_uvs', 'normals', 'colors' and the
+    OBJ material arrays, see read_obj).
+
+    With cache_dir the parsed arrays are stored as .npz keyed on the file
+    contents, so reading the same file again skips text parsing. An OBJ's
+    .mtl is not part of the key.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in MESH_READERS:
+        raise ValueError(f'Unsupported mesh format {ext}')
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(
+            cache_dir, f'{file_digest(path)}_v{CACHE_VERSION}{ext}.npz')
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                return dict(cached)
+
+    data = MESH_READERS[ext](path)
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, **data)
+        os.replace(tmp_path, cache_path)
+    return data
+
+
+def fill_mesh(mesh, data):
+    """
+    Write the arrays from read_mesh into an empty bpy mesh with foreach_set.
+    """
+    vertices = np.ascontiguousarray(data['vertices'], dtype=np.float32)
+    loop_vertices = np.ascontiguousarray(data['loop_vertices'], dtype=np.int32)
+    loop_totals = np.ascontiguousarray(data['loop_totals'], dtype=np.int32)
+    loop_starts = np.zeros(len(loop_totals), dtype=np.int32)
+    np.cumsum(loop_totals[:-1], out=loop_starts[1:])
+
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set('co', vertices.ravel())
+    mesh.loops.add(len(loop_vertices))
+    mesh.loops.foreach_set('vertex_index', loop_vertices)
+    mesh.polygons.add(len(loop_totals))
+    mesh.polygons.foreach_set('loop_start', loop_starts)
+    try:
+        mesh.polygons.foreach_set('loop_total', loop_totals)
+    except (AttributeError, TypeError, RuntimeError):
+        # Read-only in newer Blender, derived from loop_start
+        pass
+
+    mesh.update(calc_edges=True)
+    write_layers(mesh, data)
+    return mesh
+
+
+def write_layers(mesh, data):
+    """
+    Write UVs, vertex colours, face material indices and custom normals
+    from data into mesh, reusing existing layers.
+    """
+    if 'face_materials' in data:
+        mesh.polygons.foreach_set('material_index', np.ascontiguousarray(
+            data['face_materials'], dtype=np.int32))
+    if 'loop_uvs' in data:
+        uv_layer = mesh.uv_layers.active or mesh.uv_layers.new(name='UVMap')
+        uv_layer.data.foreach_set(
+            'uv', np.ascontiguousarray(data['loop_uvs'], dtype=np.float32).ravel())
+    if 'colors' in data:
+        attribute = mesh.attributes.get('Col')
+        if attribute is None:
+            attribute = mesh.attributes.new('Col', 'FLOAT_COLOR', 'POINT')
+        attribute.data.foreach_set(
+            'color', np.ascontiguousarray(data['colors'], dtype=np.float32).ravel())
+    if 'normals' in data and len(mesh.polygons):
+        if hasattr(mesh, 'use_auto_smooth'):
+            mesh.use_auto_smooth = True
+        mesh.normals_split_custom_set_from_vertices(
+            np.asarray(data['normals'], dtype=np.float32))
+
+
+def same_topology(mesh, data):
+    return (len(mesh.vertices) == len(data['vertices'])
+            and len(mesh.polygons) == len(data['loop_totals'])
+            and len(mesh.loops) == len(data['loop_vertices']))
+
+
+def update_mesh(mesh, data):
+    """
+    Overwrite mesh with data in place. Only vertex positions and layers are
+    written when the vertex, face and loop counts match; otherwise the
+    geometry is cleared and rebuilt. Returns True if topology was rebuilt.
+    """
+    if not same_topology(mesh, data):
+        mesh.clear_geometry()
+        fill_mesh(mesh, data)
+        return True
+
+    vertices = np.ascontiguousarray(data['vertices'], dtype=np.float32)
+    mesh.vertices.foreach_set('co', vertices.ravel())
+    write_layers(mesh, data)
+    mesh.update()
+    return False
+
+
+def update_points(mesh, data):
+    """
+    Overwrite a vertex-only mesh with data['vertices'] (and 'colors' when
+    present); faces in data are ignored. Vertices are only reallocated when
+    the point count changes. Returns True if it did.
+    """
+    vertices = np.ascontiguousarray(data['vertices'], dtype=np.float32)
+    resized = len(mesh.vertices) != len(vertices) or len(mesh.polygons) > 0
+    if resized:
+        mesh.clear_geometry()
+        mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set('co', vertices.ravel())
+    if 'colors' in data:
+        write_layers(mesh, {'colors': data['colors']})
+    mesh.update()
+    return resized
+
+
+# Attribute data_type -> foreach_get key and components per element
+ATTRIBUTE_KEYS = {
+    'FLOAT': ('value', 1),
+    'INT': ('value', 1),
+    'INT8': ('value', 1),
+    'BOOLEAN': ('value', 1),
+    'FLOAT2': ('vector', 2),
+    'FLOAT_VECTOR': ('vector', 3),
+    'FLOAT_COLOR': ('color', 4),
+    'BYTE_COLOR': ('color', 4),
+}
+
+
+def _foreach_get(collection, key, components, dtype):
+    values = np.empty(len(collection) * components, dtype=dtype)
+    collection.foreach_get(key, values)
+    return values.reshape(-1, components) if components > 1 else values
+
+
+def mesh_arrays(mesh, uvs=True, normals=True, attributes=()):
+    """
+    read_mesh-style arrays from a bpy mesh, read with foreach_get. The 'Col'
+    point attribute becomes 'colors'; other attributes listed in attributes
+    are stored as 'attributes/<name>'.
+    """
+    data = {
+        'vertices': _foreach_get(mesh.vertices, 'co', 3, np.float32),
+        'loop_vertices': _foreach_get(mesh.loops, 'vertex_index', 1, np.int32),
+        'loop_totals': _foreach_get(mesh.polygons, 'loop_total', 1, np.int32),
+    }
+    if uvs and mesh.uv_layers.active is not None:
+        data['loop_uvs'] = _foreach_get(mesh.uv_layers.active.data, 'uv', 2,
+                                        np.float32)
+    if normals:
+        data['normals'] = _foreach_get(mesh.vertices, 'normal', 3, np.float32)
+    color = mesh.attributes.get('Col')
+    if color is not None and color.domain == 'POINT':
+        data['colors'] = _foreach_get(color.data, 'color', 4, np.float32)
+    for name in attributes:
+        attribute = mesh.attributes[name]
+        key, components = ATTRIBUTE_KEYS[attribute.data_type]
+        dtype = {'INT': np.int32, 'INT8': np.int8,
+                 'BOOLEAN': np.bool_}.get(attribute.data_type, np.float32)
+        data[f'attributes/{name}'] = _foreach_get(attribute.data, key,
+                                                  components, dtype)
+    return data
+
+
+def object_arrays(obj, evaluated=False, depsgraph=None, world_space=False,
+                  **kwargs):
+    """
+    mesh_arrays of a mesh object, with its modifiers applied if evaluated
+    (through the depsgraph, without touching the original mesh) and in
+    world coordinates if world_space.
+    """
+    if not evaluated:
+        data = mesh_arrays(obj.data, **kwargs)
+    else:
+        if depsgraph is None:
+            import bpy
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+        evaluated_obj = obj.evaluated_get(depsgraph)
+        mesh = evaluated_obj.to_mesh()
+        try:
+            data = mesh_arrays(mesh, **kwargs)
+        finally:
+            evaluated_obj.to_mesh_clear()
+
+    if world_space:
+        M = np.array(obj.matrix_world, dtype=np.float32)
+        data['vertices'] = data['vertices'] @ M[:3, :3].T + M[:3, 3]
+        if 'normals' in data:
+            normals = data['normals'] @ np.linalg.inv(M[:3, :3])
+            normals /= np.maximum(np.linalg.norm(normals, axis=1,
+                                                 keepdims=True), 1e-12)
+            data['normals'] = normals
+    return data
+
+
+def _ply_faces(loop_vertices, loop_totals):
+    # Each face is a count followed by its int32 vertex indices
+    count_type = 'uchar' if loop_totals.max(initial=0) < 256 else 'uint'
+    count_size = 1 if count_type == 'uchar' else 4
+    n_faces = len(loop_totals)
+    loop_starts = np.zeros(n_faces, dtype=np.int64)
+    np.cumsum(loop_totals[:-1], out=loop_starts[1:])
+
+    buf = np.empty(n_faces * count_size + 4 * len(loop_vertices), dtype=np.uint8)
+    face_offsets = np.arange(n_faces) * count_size + 4 * loop_starts
+    counts = loop_totals.astype('<u1' if count_size == 1 else '<u4')
+    buf[face_offsets[:, None] + np.arange(count_size)] = \
+        counts.view(np.uint8).reshape(-1, count_size)
+    face_of_loop = np.repeat(np.arange(n_faces), loop_totals)
+    loop_offsets = (face_of_loop + 1) * count_size + 4 * np.arange(len(loop_vertices))
+    buf[loop_offsets[:, None] + np.arange(4)] = \
+        loop_vertices.astype('<i4').view(np.uint8).reshape(-1, 4)
+    return count_type, buf
+
+
+def write_ply(path, data):
+    """
+    Binary little-endian PLY with positions, normals, colours (as uchar),
+    per-vertex UVs when every vertex has a single UV, and scalar or vector
+    point attributes. Use npz to keep UV seams.
+    """
+    vertices = np.asarray(data['vertices'], dtype=np.float32)
+    n = len(vertices)
+    columns = [('x', vertices[:, 0]), ('y', vertices[:, 1]), ('z', vertices[:, 2])]
+    if 'normals' in data:
+        columns += [(f'n{axis}', data['normals'][:, i])
+                    for i, axis in enumerate('xyz')]
+    if 'colors' in data:
+        colors = np.clip(np.rint(np.asarray(data['colors']) * 255), 0, 255)
+        columns += [(name, colors[:, i].astype(np.uint8)) for i, name in
+                    enumerate(('red', 'green', 'blue', 'alpha')[:colors.shape[1]])]
+    loop_vertices = np.asarray(data['loop_vertices'], dtype=np.int32)
+    if 'loop_uvs' in data:
+        loop_uvs = np.asarray(data['loop_uvs'], dtype=np.float32)
+        uvs = np.zeros((n, 2), dtype=np.float32)
+        uvs[loop_vertices] = loop_uvs
+        if np.allclose(uvs[loop_vertices], loop_uvs):
+            columns += [('s', uvs[:, 0]), ('t', uvs[:, 1])]
+    for key, values in data.items():
+        if key.startswith('attributes/') and len(values) == n:
+            name = key.split('/', 1)[1]
+            values = np.asarray(values).reshape(n, -1)
+            if values.shape[1] == 1:
+                columns.append((name, values[:, 0]))
+            else:
+                columns += [(f'{name}_{i}', values[:, i])
+                            for i in range(values.shape[1])]
+
+    # First (canonical) PLY name per type, e.g. 'float' rather than 'float32'
+    ply_names = {}
+    for name, t in PLY_TYPES.items():
+        ply_names.setdefault(t, name)
+    columns = [(name, np.asarray(values, dtype=np.uint8)
+                if np.asarray(values).dtype == np.bool_ else np.asarray(values))
+               for name, values in columns]
+    dtype = np.dtype([(name, '<' + values.dtype.str[1:])
+                      for name, values in columns])
+    vertex = np.empty(n, dtype=dtype)
+    for name, values in columns:
+        vertex[name] = values
+
+    loop_totals = np.asarray(data['loop_totals'], dtype=np.int32)
+    header = ['ply', 'format binary_little_endian 1.0',
+              f'element vertex {n}']
+    header += [f'property {ply_names[dtype[name].str[1:]]} {name}'
+               for name in dtype.names]
+    if len(loop_totals):
+        count_type, faces = _ply_faces(loop_vertices, loop_totals)
+        header += [f'element face {len(loop_totals)}',
+                   f'property list {count_type} int vertex_indices']
+    header.append('end_header')
+
+    with open(path, 'wb') as f:
+        f.write(('\n'.join(header) + '\n').encode('ascii'))
+        f.write(vertex.tobytes())
+        if len(loop_totals):
+            f.write(faces.tobytes())
+    return path
+
+
+def write_npz(path, data, compress=True):
+    (np.savez_compressed if compress else np.savez)(path, **data)
+    return path
+
+
+MESH_WRITERS = {
+    '.ply': write_ply,
+    '.npz': write_npz,
+}
+
+
+def write_mesh(path, data):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in MESH_WRITERS:
+        raise ValueError(f'Unsupported mesh format {ext}, expected one of '
+                         f'{sorted(MESH_WRITERS)}')
+    return MESH_WRITERS[ext](path, data)
+
+
+def export_meshes(objects, paths, evaluated=False, world_space=False,
+                  pipeline=None, workers=4, **kwargs):
+    """
+    Export many mesh objects to .ply/.npz in one call. Arrays are read on
+    the calling thread (bpy is not thread-safe) while compression and
+    writes run on an OutputPipeline, created for the call unless one is
+    passed in. Returns the paths once everything is written.
+    """
+    from .pipeline import OutputPipeline
+
+    objects = list(objects)
+    paths = list(paths)
+    if len(objects) != len(paths):
+        raise ValueError(f'Got {len(objects)} objects but {len(paths)} paths')
+    for path in paths:
+        if os.path.splitext(path)[1].lower() not in MESH_WRITERS:
+            raise ValueError(f'Unsupported mesh format for {path}')
+
+    depsgraph = None
+    if evaluated:
+        import bpy
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    def submit_all(pipeline):
+        for obj, path in zip(objects, paths):
+            data = object_arrays(obj, evaluated, depsgraph, world_space,
+                                 **kwargs)
+            pipeline.submit(write_mesh, path, data)
+        pipeline.flush()
+
+    if pipeline is not None:
+        submit_all(pipeline)
+    else:
+        with OutputPipeline(workers=workers, max_pending=2 * workers) as pipeline:
+            submit_all(pipeline)
+    return paths
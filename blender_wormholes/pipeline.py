@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class OutputPipeline:
+    """
+    Bounded worker pool for per-frame output work (EXR decoding, depth
+    conversion, mask extraction, writes) so it overlaps with the next
+    render.
+
+    submit() blocks once max_pending tasks are queued or running, which
+    keeps memory bounded. The first exception raised by a task is re-raised
+    in the main loop by the next submit(), flush() or close().
+    """
+    def __init__(self, workers=4, max_pending=8):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.futures = set()
+        self.errors = []
+        # Failed futures already in errors, from either _done or flush
+        self.failed = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Already failing, do not mask the error with one from a worker
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _record_error(self, future):
+        if (future.cancelled() or future.exception() is None
+                or future in self.failed):
+            return
+        self.failed.add(future)
+        self.errors.append(future.exception())
+
+    def _done(self, future):
+        with self.lock:
+            self.futures.discard(future)
+            self._record_error(future)
+        self.slots.release()
+
+    def raise_errors(self):
+        with self.lock:
+            if not self.errors:
+                return
+            error = self.errors[0]
+            self.errors.clear()
+        raise error
+
+    def submit(self, fn, *args, **kwargs):
+        self.raise_errors()
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def pending(self):
+        with self.lock:
+            return len(self.futures)
+
+    def flush(self):
+        """Barrier: wait for every submitted task, then surface errors"""
+        with self.lock:
+            futures = list(self.futures)
+        wait(futures)
+        # wait() can return before the done callbacks have run
+        with self.lock:
+            for future in futures:
+                self._record_error(future)
+        self.raise_errors()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown(wait=True)
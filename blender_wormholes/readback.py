@@ -0,0 +1,43 @@
+import bpy
+import numpy as np
+
+
+# One float32 buffer per (resolution, pass, channel count)
+_buffers = {}
+
+
+def get_buffer(resolution, pass_name, channels=4):
+    key = (tuple(resolution), pass_name, channels)
+    buf = _buffers.get(key)
+    if buf is None:
+        res_x, res_y = resolution
+        buf = np.empty((res_y, res_x, channels), dtype=np.float32)
+        _buffers[key] = buf
+    return buf
+
+
+def clear_buffers():
+    _buffers.clear()
+
+
+def read_pixels(filepath, pass_name, channels=None):
+    """
+    Load an image, copy its pixels into the shared buffer for its
+    resolution and pass with foreach_get and remove the datablock again.
+
+    Returns a vertically flipped (top row first) view of the buffer. An int
+    or slice for channels keeps it a view; it stays valid until the next
+    read of the same pass at the same resolution.
+    """
+    image = bpy.data.images.load(filepath, check_existing=False)
+    try:
+        buf = get_buffer(tuple(image.size), pass_name, image.channels)
+        image.pixels.foreach_get(buf.reshape(-1))
+    finally:
+        bpy.data.images.remove(image)
+
+    # flip vertically (in Blender y in the image points up instead of down)
+    view = buf[::-1]
+    if channels is not None:
+        view = view[:, :, channels]
+    return view
@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import importlib
+import importlib.util
+import subprocess
+import traceback
+
+
+# Marks worker replies on stdout, which Blender shares with its own logging
+RESULT_PREFIX = '@wh-result '
+
+WORKER_EXPR = 'from blender_wormholes.scheduler import worker_main; worker_main()'
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def load_callback(spec):
+    """
+    Resolve 'package.module:function' or '/path/to/file.py:function'.
+    """
+    module_name, _, func_name = spec.rpartition(':')
+    if module_name.endswith('.py'):
+        name = os.path.splitext(os.path.basename(module_name))[0]
+        module_spec = importlib.util.spec_from_file_location(name, module_name)
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_name)
+    return getattr(module, func_name)
+
+
+def item_key(item):
+    if isinstance(item, str):
+        return item
+    return json.dumps(item, sort_keys=True)
+
+
+def worker_main():
+    """
+    Entry point run inside a background Blender process. Reads one JSON
+    job per line from stdin and answers with a RESULT_PREFIX line.
+    """
+    from .core import Scene
+
+    argv = sys.argv[sys.argv.index('--') + 1:]
+    callback = load_callback(argv[0])
+    threads = int(argv[1])
+
+    sc = Scene()
+    if threads:
+        sc.scene.render.threads_mode = 'FIXED'
+        sc.scene.render.threads = threads
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        try:
+            reply = {'ok': True, 'result': callback(sc, job['item'])}
+        except Exception:
+            reply = {'ok': False, 'error': traceback.format_exc()}
+        sys.stdout.write(RESULT_PREFIX + json.dumps(reply, default=str) + '\n')
+        sys.stdout.flush()
+
+
+class BlenderWorker:
+    """
+    A headless Blender process with blend_path loaded, running callback on
+    every item sent to it.
+    """
+    def __init__(self, blend_path, callback, threads=0, blender='blender'):
+        self.blend_path = blend_path
+        self.callback = callback
+        self.threads = threads
+        self.blender = blender
+        self.process = None
+
+    def start(self):
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            p for p in (package_root, env.get('PYTHONPATH')) if p)
+        cmd = [self.blender, '-b', self.blend_path, '--python-expr',
+               WORKER_EXPR, '--', self.callback, str(self.threads)]
+        self.process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+            text=True, bufsize=1)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, item):
+        if not self.alive():
+            self.start()
+        try:
+            self.process.stdin.write(json.dumps({'item': item}) + '\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise WorkerCrashed(f'worker exited with {self.process.poll()}')
+
+        for line in self.process.stdout:
+            if line.startswith(RESULT_PREFIX):
+                return json.loads(line[len(RESULT_PREFIX):])
+        self.process.wait()
+        raise WorkerCrashed(f'worker exited with {self.process.returncode}')
+
+    def stop(self, timeout=10):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+class Manifest:
+    """
+    Append-only JSON lines record of finished items, so an interrupted run
+    can resume without redoing them.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Partial last line from an interrupted run
+                        continue
+                    if entry['status'] == 'done':
+                        self.done.add(entry['key'])
+
+    def record(self, entry):
+        if entry['status'] == 'done':
+            self.done.add(entry['key'])
+        if not self.path:
+            return
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry, default=str) + '\n')
+
+
+class RenderScheduler:
+    """
+    Runs callback(scene, item) for every item across several headless
+    Blender processes with blend_path loaded.
+
+    callback is an importable 'module:function' or 'file.py:function'
+    string, items must be JSON serialisable. Items are handed out one at a
+    time to whichever worker is idle; items whose callback raises or whose
+    worker crashes or cannot start are retried up to max_retries times and
+    then recorded as failed. run() re-raises errors of the scheduler
+    itself, such as an unwritable manifest.
+    """
+    def __init__(self, blend_path, callback, workers=None, threads=None,
+                 max_retries=2, manifest_path=None, blender='blender'):
+        cpu_count = os.cpu_count() or 1
+        if workers is None:
+            workers = max(1, cpu_count // (threads or 4))
+        if threads is None:
+            threads = max(1, cpu_count // workers)
+        self.blend_path = blend_path
+        self.callback = callback
+        self.workers = workers
+        self.threads = threads
+        self.max_retries = max_retries
+        self.blender = blender
+        self.manifest = Manifest(manifest_path)
+
+    def run(self, items):
+        pending = queue.Queue()
+        remaining = 0
+        skipped = 0
+        for item in items:
+            if item_key(item) in self.manifest.done:
+                skipped += 1
+            else:
+                pending.put((item, 0))
+                remaining += 1
+
+        state = {'remaining': remaining, 'done': 0, 'failed': 0}
+        lock = threading.Lock()
+        # Set when a serving thread dies, so the others stop waiting for
+        # items it will never finish
+        abort = threading.Event()
+        errors = []
+
+        def finish(status):
+            with lock:
+                state['remaining'] -= 1
+                state[status] += 1
+
+        def serve(worker_id):
+            worker = BlenderWorker(self.blend_path, self.callback,
+                                   self.threads, self.blender)
+            try:
+                while not abort.is_set():
+                    try:
+                        item, attempts = pending.get(timeout=0.1)
+                    except queue.Empty:
+                        with lock:
+                            if state['remaining'] == 0:
+                                return
+                        continue
+
+                    start = time.time()
+                    try:
+                        reply = worker.run(item)
+                    except Exception as e:
+                        # A crash, but also e.g. a missing blender binary or
+                        # a garbled reply: retried like a crash
+                        reply = {'ok': False,
+                                 'error': f'{type(e).__name__}: {e}'}
+                        worker.stop()
+
+                    entry = {'key': item_key(item), 'worker': worker_id,
+                             'attempts': attempts + 1,
+                             'time': time.time() - start}
+                    if reply['ok']:
+                        entry.update(status='done', result=reply['result'])
+                        self.manifest.record(entry)
+                        finish('done')
+                    elif attempts < self.max_retries:
+                        pending.put((item, attempts + 1))
+                    else:
+                        entry.update(status='failed', error=reply['error'])
+                        self.manifest.record(entry)
+                        finish('failed')
+            except Exception as e:
+                errors.append(e)
+                abort.set()
+            finally:
+                worker.stop()
+
+        threads = [threading.Thread(target=serve, args=(i,), daemon=True)
+                   for i in range(min(self.workers, max(remaining, 1)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+        return {'done': state['done'], 'failed': state['failed'],
+                'skipped': skipped}
+
+    def run_queue(self, work_queue, node=None):
+        """
+        Like run(), but the items come from a FileWorkQueue shared with
+        other nodes. Worker i claims as '<node>-<i>'; retries and lease
+        expiry are left to the queue. Returns each worker's stats.
+        """
+        from .workqueue import default_node
+        node = node or default_node()
+        stats = {}
+
+        def serve(worker_id):
+            worker = BlenderWorker(self.blend_path, self.callback,
+                                   self.threads, self.blender)
+
+            def process(item):
+                try:
+                    reply = worker.run(item)
+                except Exception:
+                    worker.stop()
+                    raise
+                if not reply['ok']:
+                    raise RuntimeError(reply['error'])
+                return reply['result']
+
+            try:
+                worker_node = f'{node}-{worker_id}'
+                stats[worker_node] = work_queue.run(process, node=worker_node)
+            finally:
+                worker.stop()
+
+        threads = [threading.Thread(target=serve, args=(i,), daemon=True)
+                   for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return stats
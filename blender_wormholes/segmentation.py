@@ -0,0 +1,233 @@
+import os
+import json
+import numpy as np
+from .constants import MAX_PASS_INDEX
+
+
+class InstanceRegistry:
+    """
+    Stable object name <-> instance id map driving Object.pass_index, so
+    the IndexOB pass decodes to the same ids across frames and runs. Ids
+    start at 1, 0 is background, and stop at MAX_PASS_INDEX, the largest
+    pass_index Blender keeps; once that is reached the ids of released
+    names are reused (see prune). With path the map is loaded from and
+    saved to a JSON file.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.ids = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.ids = json.load(f)
+        self.names = {i: name for name, i in self.ids.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def id(self, name):
+        if name not in self.ids:
+            i = max(self.names, default=0) + 1
+            if i > MAX_PASS_INDEX:
+                i = next((i for i in range(1, MAX_PASS_INDEX + 1)
+                          if i not in self.names), None)
+                if i is None:
+                    raise ValueError(f'All {MAX_PASS_INDEX} instance ids are '
+                                     f'in use, cannot add {name}')
+            self.ids[name] = i
+            self.names[i] = name
+        return self.ids[name]
+
+    def release(self, names):
+        """Forget names so their ids can be given to new objects"""
+        for name in names:
+            i = self.ids.pop(name, None)
+            if i is not None:
+                del self.names[i]
+
+    def prune(self):
+        """Release the names of objects no longer in bpy.data"""
+        import bpy
+        self.release([name for name in self.ids
+                      if name not in bpy.data.objects])
+
+    def name(self, i):
+        return self.names.get(int(i))
+
+    def assign(self, objects=None):
+        """
+        Give every object (names or bpy objects, default all mesh objects in
+        bpy.data) its registry id as pass_index, pruning deleted objects
+        first when the ids would run out. Returns {name: id}.
+        """
+        # Imported here so the mask encoding works outside Blender
+        import bpy
+        if objects is None:
+            objects = [obj for obj in bpy.data.objects if obj.type == 'MESH']
+        objects = [bpy.data.objects[obj] if isinstance(obj, str) else obj
+                   for obj in objects]
+        new = sum(obj.name not in self.ids for obj in objects)
+        if len(self.ids) + new > MAX_PASS_INDEX:
+            self.prune()
+        assigned = {}
+        for obj in objects:
+            obj.pass_index = self.id(obj.name)
+            assigned[obj.name] = obj.pass_index
+        return assigned
+
+    def save(self, path=None):
+        path = path or self.path
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.ids, f)
+        os.replace(tmp_path, path)
+
+
+def decode_mask(index_ob, dtype=None):
+    """
+    Round the float IndexOB pass to integer ids. dtype defaults to the
+    smallest of uint16/uint32 that holds the largest id; ids that do not fit
+    the requested dtype raise instead of wrapping.
+    """
+    ids = np.rint(index_ob)
+    max_id = ids.max(initial=0)
+    if dtype is None:
+        dtype = np.uint16 if max_id <= np.iinfo(np.uint16).max else np.uint32
+    if max_id > np.iinfo(dtype).max:
+        raise ValueError(f'Instance id {int(max_id)} does not fit '
+                         f'{np.dtype(dtype).name}')
+    return ids.astype(dtype)
+
+
+def _runs(mask):
+    """
+    Runs of equal ids over the column-major (COCO order) flattening of
+    mask, broken at column boundaries: (ids, starts, lengths).
+    """
+    h, w = mask.shape
+    flat = mask.ravel(order='F')
+    breaks = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    breaks = np.union1d(breaks, np.arange(h, h * w, h))
+    starts = np.concatenate(([0], breaks))
+    lengths = np.diff(np.append(starts, h * w))
+    return flat[starts], starts, lengths
+
+
+def encode_counts(counts):
+    """COCO's compact string form of uncompressed RLE counts"""
+    chars = []
+    for i, x in enumerate(counts):
+        x = int(x)
+        if i > 2:
+            x -= int(counts[i - 2])
+        more = True
+        while more:
+            c = x & 0x1f
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return ''.join(chars)
+
+
+def decode_counts(string):
+    counts = []
+    p = 0
+    while p < len(string):
+        x = 0
+        k = 0
+        more = True
+        while more:
+            c = ord(string[p]) - 48
+            x |= (c & 0x1f) << (5 * k)
+            more = c & 0x20
+            p += 1
+            k += 1
+            if not more and c & 0x10:
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
+
+
+def decode_rle(rle):
+    """Dense (h, w) bool mask from a COCO RLE dict"""
+    h, w = rle['size']
+    counts = rle['counts']
+    if isinstance(counts, (str, bytes)):
+        counts = decode_counts(counts if isinstance(counts, str)
+                               else counts.decode())
+    values = np.arange(len(counts)) % 2 == 1
+    return np.repeat(values, counts).reshape((h, w), order='F')
+
+
+def instances(mask, background=0, registry=None, compress=False):
+    """
+    Per-instance COCO-style annotations of an integer id mask in one pass
+    over its runs: a list of dicts with 'id', 'area', 'bbox' as
+    [x, y, width, height] and 'segmentation' as RLE {'size', 'counts'}.
+    With compress the counts are COCO's compact string, and a registry adds
+    each instance's object 'name'.
+    """
+    h, w = mask.shape
+    ids, starts, lengths = _runs(mask)
+    keep = ids != background
+    ids, starts, lengths = ids[keep], starts[keep], lengths[keep]
+    if not len(ids):
+        return []
+
+    # Group the runs by id, in column-major order within each id
+    order = np.argsort(ids, kind='stable')
+    ids, starts, lengths = ids[order], starts[order], lengths[order]
+    first = np.concatenate(([True], ids[1:] != ids[:-1]))
+    group_starts = np.flatnonzero(first)
+    instance_ids = ids[group_starts]
+
+    area = np.add.reduceat(lengths, group_starts)
+    rows, cols = starts % h, starts // h
+    x_min = np.minimum.reduceat(cols, group_starts)
+    x_max = np.maximum.reduceat(cols, group_starts)
+    y_min = np.minimum.reduceat(rows, group_starts)
+    y_max = np.maximum.reduceat(rows + lengths - 1, group_starts)
+
+    # Merge runs that were only split at a column boundary
+    ends = starts + lengths
+    contiguous = ~first
+    contiguous[1:] &= starts[1:] == ends[:-1]
+    merged = np.cumsum(~contiguous) - 1
+    keep = ~contiguous
+    run_starts = starts[keep]
+    run_lengths = np.bincount(merged, weights=lengths).astype(np.int64)
+    run_first = first[keep]
+    run_ends = run_starts + run_lengths
+
+    # counts alternate background/foreground, starting with background
+    gaps = run_starts - np.concatenate(([0], run_ends[:-1]))
+    gaps[run_first] = run_starts[run_first]
+    pairs = np.stack((gaps, run_lengths), axis=1)
+    group_bounds = np.append(np.flatnonzero(run_first), len(run_starts))
+
+    annotations = []
+    for g, instance_id in enumerate(instance_ids):
+        lo, hi = group_bounds[g], group_bounds[g + 1]
+        counts = pairs[lo:hi].ravel().tolist()
+        tail = h * w - int(run_ends[hi - 1])
+        if tail:
+            counts.append(tail)
+        annotation = {
+            'id': int(instance_id),
+            'area': int(area[g]),
+            'bbox': [int(x_min[g]), int(y_min[g]),
+                     int(x_max[g] - x_min[g] + 1), int(y_max[g] - y_min[g] + 1)],
+            'segmentation': {'size': [h, w],
+                             'counts': encode_counts(counts) if compress
+                             else counts},
+        }
+        if registry is not None:
+            annotation['name'] = registry.name(instance_id)
+        annotations.append(annotation)
+    return annotations
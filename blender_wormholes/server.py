@@ -0,0 +1,122 @@
+import os
+import json
+import queue
+import socket
+import tempfile
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from .scheduler import BlenderWorker, WorkerCrashed
+
+
+DEFAULT_CALLBACK = 'blender_wormholes.jobs:run_job'
+
+
+def default_socket_path():
+    return os.path.join(tempfile.gettempdir(), f'wh-{os.getuid()}.sock')
+
+
+def _listening(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+
+class WorkerServer:
+    """
+    Keeps workers warm Blender processes with blend_path loaded and serves
+    JSON job specs (see jobs.render_job) over a Unix socket: one JSON
+    object per line in, one reply per line out. Jobs go to whichever
+    worker is idle; a crashed worker is restarted and warmed again.
+    """
+    def __init__(self, blend_path, socket_path=None, workers=1, threads=0,
+                 callback=DEFAULT_CALLBACK, blender='blender'):
+        self.blend_path = blend_path
+        self.socket_path = socket_path or default_socket_path()
+        self.workers = [BlenderWorker(blend_path, callback, threads, blender)
+                        for _ in range(workers)]
+        self.idle = queue.Queue()
+        self.server = None
+
+    def _warm(self, worker):
+        # The first job loads the scene and snapshots it
+        reply = worker.run({'ping': True})
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+
+    def start(self):
+        # Checked before warming the workers, which takes a while
+        if os.path.exists(self.socket_path):
+            if _listening(self.socket_path):
+                raise RuntimeError(f'A server is already running on '
+                                   f'{self.socket_path}')
+            # Left over from a server that did not shut down cleanly
+            os.remove(self.socket_path)
+
+        with ThreadPoolExecutor(len(self.workers)) as pool:
+            list(pool.map(self._warm, self.workers))
+        for worker in self.workers:
+            self.idle.put(worker)
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        reply = server.run(json.loads(line))
+                    except ValueError as e:
+                        reply = {'ok': False, 'error': f'Invalid job: {e}'}
+                    self.wfile.write(
+                        (json.dumps(reply, default=str) + '\n').encode())
+                    self.wfile.flush()
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path,
+                                                             Handler)
+        self.server.daemon_threads = True
+        return self
+
+    def run(self, job):
+        worker = self.idle.get()
+        try:
+            return worker.run(job)
+        except WorkerCrashed as e:
+            worker.stop()
+            try:
+                self._warm(worker)
+            except (WorkerCrashed, RuntimeError):
+                worker.stop()
+            return {'ok': False, 'error': str(e)}
+        finally:
+            self.idle.put(worker)
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.server_close()
+            self.server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        for worker in self.workers:
+            worker.stop()
+
+
+def submit(job, socket_path=None, timeout=None):
+    """Send one job to a running `wh serve` and return its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path or default_socket_path())
+        sock.sendall((json.dumps(job) + '\n').encode())
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError('Server closed the connection')
+    return json.loads(line)
@@ -0,0 +1,157 @@
+import re
+import time
+import bpy
+
+
+# Cycles status text -> stage, checked in order
+STAGE_PATTERNS = (
+    ('bvh', re.compile(r'BVH', re.I)),
+    ('sampling', re.compile(r'Sample|Rendering|Denois|Path Tracing', re.I)),
+    ('sync', re.compile(r'Synchroniz|Updating|Loading|Compiling|Initializing', re.I)),
+)
+
+# What Cycles has to redo with persistent data for each kind of change
+CHANGE_COSTS = {
+    'geometry': 'object BVH rebuild',
+    'transform': 'top level BVH update',
+    'shading': 'shader recompile',
+    'scene': 'full scene resync',
+}
+
+
+# Leading frame, time and memory fields of the render stats text
+HEADER_FIELD = re.compile(r'^(Fra|Mem|Time|Remaining|Peak)\b', re.I)
+
+
+def stage_of(stats):
+    """
+    Stage of a Cycles stats line such as 'Fra:1 | Mem:.. | Scene, ViewLayer
+    | Synchronizing object | Cube'. Every status field after the scene and
+    view layer is checked, since the last one is often just an object name.
+    """
+    fields = [field.strip() for field in stats.split('|')]
+    i = 0
+    while i < len(fields) and HEADER_FIELD.match(fields[i]):
+        i += 1
+    if i < len(fields) and ',' in fields[i]:
+        i += 1
+    for status in fields[i:]:
+        for stage, pattern in STAGE_PATTERNS:
+            if pattern.search(status):
+                return stage
+    return 'other'
+
+
+class RenderSession:
+    """
+    Renders frames with persistent data enabled, so Cycles keeps scene data
+    and BVH between renders, and reports per frame what changed since the
+    previous one and how long sync, BVH building and sampling took.
+    """
+    def __init__(self, scene):
+        self.scene = scene
+        self.changes = self._empty_changes()
+        self.stage = None
+        self.stage_start = None
+        self.timings = {}
+        self.frames = []
+        self.previous_persistent_data = None
+
+    def _empty_changes(self):
+        return {kind: set() for kind in CHANGE_COSTS}
+
+    def start(self):
+        self.previous_persistent_data = self.scene.render.use_persistent_data
+        self.scene.render.use_persistent_data = True
+        bpy.app.handlers.depsgraph_update_post.append(self._on_depsgraph_update)
+        bpy.app.handlers.render_stats.append(self._on_render_stats)
+        # Everything counts as changed for the first frame
+        self.changes['scene'].add(self.scene.name)
+        return self
+
+    def stop(self):
+        for handlers, handler in (
+                (bpy.app.handlers.depsgraph_update_post, self._on_depsgraph_update),
+                (bpy.app.handlers.render_stats, self._on_render_stats)):
+            if handler in handlers:
+                handlers.remove(handler)
+        if self.previous_persistent_data is not None:
+            self.scene.render.use_persistent_data = self.previous_persistent_data
+            self.previous_persistent_data = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _on_depsgraph_update(self, scene, depsgraph=None):
+        if depsgraph is None:
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+        for update in depsgraph.updates:
+            # Any Scene property write (render.filepath, frame, ...) tags
+            # the Scene ID; Cycles only resyncs what those writes tag
+            # further down, which arrives as its own update
+            if isinstance(update.id, bpy.types.Scene):
+                continue
+            name = update.id.name
+            if update.is_updated_geometry:
+                self.changes['geometry'].add(name)
+            if update.is_updated_transform:
+                self.changes['transform'].add(name)
+            if update.is_updated_shading:
+                self.changes['shading'].add(name)
+
+    def _on_render_stats(self, stats, *args):
+        now = time.perf_counter()
+        stage = stage_of(stats)
+        if stage == self.stage:
+            return
+        self._close_stage(now)
+        self.stage = stage
+        self.stage_start = now
+
+    def _close_stage(self, now):
+        if self.stage is not None:
+            self.timings[self.stage] = (self.timings.get(self.stage, 0.0)
+                                        + now - self.stage_start)
+
+    def pending_changes(self):
+        """
+        Changes since the last rendered frame and what each will cost.
+        """
+        # Flush pending property writes into the depsgraph handlers
+        bpy.context.view_layer.update()
+        changes = {kind: sorted(names) for kind, names in self.changes.items()
+                   if names}
+        rebuilds = [CHANGE_COSTS[kind] for kind in changes]
+        return changes, rebuilds
+
+    def render(self, path=None, write_still=True):
+        # Before collecting changes, so the write lands in this frame's
+        # depsgraph update rather than the next frame's
+        if path is not None and self.scene.render.filepath != path:
+            self.scene.render.filepath = path
+        changes, rebuilds = self.pending_changes()
+
+        self.timings = {}
+        self.stage = None
+        start = time.perf_counter()
+        bpy.ops.render.render(write_still=write_still)
+        end = time.perf_counter()
+        self._close_stage(end)
+        self.stage = None
+
+        timings = {stage: self.timings.get(stage, 0.0)
+                   for stage in ('sync', 'bvh', 'sampling', 'other')}
+        timings['total'] = end - start
+        report = {
+            'frame': len(self.frames),
+            'changes': changes,
+            'rebuilds': rebuilds,
+            'full_rebuild': 'scene' in changes,
+            'timings': timings,
+        }
+        self.frames.append(report)
+        self.changes = self._empty_changes()
+        return report
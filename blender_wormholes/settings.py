@@ -0,0 +1,205 @@
+import bpy
+import math
+
+
+def _vector(value):
+    return tuple(float(v) for v in value)
+
+
+# Config section -> key -> (RNA path from the owner, type)
+SCHEMA = {
+    'render': {
+        'engine': ('render.engine', str),
+        'resolution_x': ('render.resolution_x', int),
+        'resolution_y': ('render.resolution_y', int),
+        'resolution_percentage': ('render.resolution_percentage', int),
+        'filepath': ('render.filepath', str),
+        'film_transparent': ('render.film_transparent', bool),
+        'use_persistent_data': ('render.use_persistent_data', bool),
+        'threads_mode': ('render.threads_mode', str),
+        'threads': ('render.threads', int),
+    },
+    'image': {
+        'file_format': ('render.image_settings.file_format', str),
+        'color_mode': ('render.image_settings.color_mode', str),
+        'color_depth': ('render.image_settings.color_depth', str),
+        'compression': ('render.image_settings.compression', int),
+    },
+    'cycles': {
+        'device': ('cycles.device', str),
+        'progressive': ('cycles.progressive', str),
+        'samples': ('cycles.samples', int),
+        'use_adaptive_sampling': ('cycles.use_adaptive_sampling', bool),
+        'adaptive_threshold': ('cycles.adaptive_threshold', float),
+        'max_bounces': ('cycles.max_bounces', int),
+        'diffuse_bounces': ('cycles.diffuse_bounces', int),
+        'glossy_bounces': ('cycles.glossy_bounces', int),
+        'transmission_bounces': ('cycles.transmission_bounces', int),
+        'use_denoising': ('cycles.use_denoising', bool),
+        'seed': ('cycles.seed', int),
+    },
+    'world': {
+        'color': ('world.color', _vector),
+        'strength': ('world.node_tree.nodes["Background"].inputs[1].default_value', float),
+    },
+    # Keyed by light datablock name, each a dict of these properties
+    'lights': {
+        'energy': ('energy', float),
+        'color': ('color', _vector),
+        'shadow_soft_size': ('shadow_soft_size', float),
+    },
+}
+
+# Per-frame overrides -> (section, key)
+OVERRIDES = {
+    'output_path': ('render', 'filepath'),
+    'seed': ('cycles', 'seed'),
+    'samples': ('cycles', 'samples'),
+}
+
+
+def _validate(section, values):
+    schema = SCHEMA[section]
+    validated = {}
+    for key, value in values.items():
+        if key not in schema:
+            raise ValueError(f'Unknown {section} setting {key}, expected one '
+                             f'of {sorted(schema)}')
+        try:
+            validated[key] = schema[key][1](value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid value {value!r} for {section}.{key}')
+    return validated
+
+
+class SceneConfig:
+    """
+    Validated render, image, cycles, world and per-light settings. Only
+    the keys that are given are managed; everything else is left as it is
+    in the scene. Configs are not modified in place, updated() returns a
+    new one.
+    """
+    def __init__(self, render=None, image=None, cycles=None, world=None,
+                 lights=None):
+        self.sections = {}
+        for section, values in (('render', render), ('image', image),
+                                ('cycles', cycles), ('world', world)):
+            self.sections[section] = _validate(section, values or {})
+        self.lights = {name: _validate('lights', values)
+                       for name, values in (lights or {}).items()}
+        self._flat = None
+
+    @classmethod
+    def from_dict(cls, settings):
+        unknown = set(settings) - set(SCHEMA)
+        if unknown:
+            raise ValueError(f'Unknown settings sections {sorted(unknown)}')
+        return cls(**settings)
+
+    def to_dict(self):
+        settings = {section: dict(values)
+                    for section, values in self.sections.items() if values}
+        if self.lights:
+            settings['lights'] = {name: dict(values)
+                                  for name, values in self.lights.items()}
+        return settings
+
+    def updated(self, **sections):
+        settings = self.to_dict()
+        for section, values in sections.items():
+            if section == 'lights':
+                lights = settings.setdefault('lights', {})
+                for name, light_values in values.items():
+                    lights.setdefault(name, {}).update(light_values)
+            else:
+                settings.setdefault(section, {}).update(values)
+        return SceneConfig.from_dict(settings)
+
+    def flatten(self):
+        """{(owner, rna_path): value}, owner None for the scene"""
+        if self._flat is None:
+            flat = {}
+            for section, values in self.sections.items():
+                for key, value in values.items():
+                    flat[(None, SCHEMA[section][key][0])] = value
+            for name, values in self.lights.items():
+                for key, value in values.items():
+                    flat[(name, SCHEMA['lights'][key][0])] = value
+            self._flat = flat
+        return self._flat
+
+
+def _same(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-9)
+    if isinstance(a, tuple):
+        b = tuple(b)
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+class ConfigApplier:
+    """
+    Writes a SceneConfig to a scene touching only properties whose value
+    differs, so re-applying an unchanged config causes no RNA writes and no
+    depsgraph or render cache invalidation. Values are always compared to
+    the live RNA value (reading does not tag the depsgraph), so writes made
+    elsewhere, e.g. by Scene.render or AdaptiveQuality, are corrected on
+    the next apply. Properties that this Blender version lacks are skipped;
+    unknown lights and paths that do not resolve (e.g. a world without a
+    node tree) raise.
+    """
+    def __init__(self, scene):
+        self.scene = scene
+
+    def _owner(self, owner, path):
+        if owner is None:
+            data = self.scene
+        else:
+            data = bpy.data.lights.get(owner)
+            if data is None:
+                raise KeyError(f'No light named {owner}')
+        if '.' in path:
+            parent, attr = path.rsplit('.', 1)
+            try:
+                data = data.path_resolve(parent)
+            except ValueError:
+                data = None
+            if data is None:
+                raise ValueError(f'Cannot resolve {parent} to set {attr}')
+        else:
+            attr = path
+        return data, attr
+
+    def _write(self, key, value):
+        data, attr = self._owner(*key)
+        if not hasattr(data, attr):
+            # Not in this Blender version, e.g. cycles.progressive
+            return False
+        current = getattr(data, attr)
+        if isinstance(value, tuple):
+            current = tuple(current)
+        if _same(value, current):
+            return False
+        setattr(data, attr, value)
+        return True
+
+    def apply(self, config, **overrides):
+        """
+        Apply config plus per-frame overrides (output_path, seed, samples),
+        which win over the config for this call; the config value, if it
+        has one, is written back once an override is dropped. Returns the
+        changed (owner, rna_path) keys.
+        """
+        flat = config.flatten()
+        if overrides:
+            flat = dict(flat)
+            for name, value in overrides.items():
+                if name not in OVERRIDES:
+                    raise ValueError(f'Unknown override {name}, expected one '
+                                     f'of {sorted(OVERRIDES)}')
+                if value is not None:
+                    section, key = OVERRIDES[name]
+                    path, cast = SCHEMA[section][key]
+                    flat[(None, path)] = cast(value)
+        return [key for key, value in flat.items() if self._write(key, value)]
@@ -0,0 +1,172 @@
+import os
+import csv
+import json
+import time
+import resource
+import functools
+import threading
+import bpy
+
+from . import core
+from . import session
+
+
+# Classes whose public methods are wrapped by enable()
+TRACED_CLASSES = (core.Scene, core.Object, core.Shaders, core.Camera,
+                  session.RenderSession)
+
+# Methods that start a new frame when auto_frames is on
+RENDER_METHODS = ('Scene.render', 'Scene.render_one_frame',
+                  'RenderSession.render')
+
+DATABLOCKS = ('objects', 'meshes', 'materials', 'images')
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # Peak rather than current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def datablock_counts():
+    return {name: len(getattr(bpy.data, name)) for name in DATABLOCKS}
+
+
+class Tracer:
+    """
+    Collects one span per traced call: wall time, datablock counts and
+    process RSS when it ended, and the frame it belongs to.
+
+    Frames are delimited by calling next_frame() at the top of the render
+    loop. With auto_frames every render call starts a new frame instead, so
+    a frame is a render plus everything up to the next one: the import and
+    shading done for frame N + 1 end up in frame N.
+    """
+    def __init__(self, auto_frames=False):
+        self.auto_frames = auto_frames
+        self.spans = []
+        self.frame = 0
+        self.origin = time.perf_counter()
+        self.local = threading.local()
+
+    def next_frame(self):
+        self.frame += 1
+
+    def wrap(self, name, fn):
+        @functools.wraps(fn)
+        def traced(*args, **kwargs):
+            if self.auto_frames and name in RENDER_METHODS:
+                self.next_frame()
+            depth = getattr(self.local, 'depth', 0)
+            self.local.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                self.local.depth = depth
+                self.spans.append({
+                    'name': name,
+                    'frame': self.frame,
+                    'start': start - self.origin,
+                    'duration': end - start,
+                    'depth': depth,
+                    'tid': threading.get_ident(),
+                    'rss': rss_bytes(),
+                    **datablock_counts(),
+                })
+        return traced
+
+    def export_chrome_trace(self, path):
+        """Chrome trace / Perfetto JSON, open in ui.perfetto.dev"""
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = {key: span[key] for key in ('frame', 'rss') + DATABLOCKS}
+            events.append({
+                'name': span['name'],
+                'cat': span['name'].split('.')[0],
+                'ph': 'X',
+                'ts': span['start'] * 1e6,
+                'dur': span['duration'] * 1e6,
+                'pid': pid,
+                'tid': span['tid'],
+                'args': args,
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def frame_summary(self):
+        frames = {}
+        for span in self.spans:
+            frame = frames.setdefault(span['frame'], {
+                'frame': span['frame'], 'start': span['start'], 'end': 0.0,
+                'rss_max': 0, 'totals': {}})
+            end = span['start'] + span['duration']
+            frame['start'] = min(frame['start'], span['start'])
+            frame['end'] = max(frame['end'], end)
+            frame['rss_max'] = max(frame['rss_max'], span['rss'])
+            if frame['end'] == end:
+                frame.update({name: span[name] for name in DATABLOCKS})
+            totals = frame['totals']
+            totals[span['name']] = totals.get(span['name'], 0.0) + span['duration']
+        return [frames[key] for key in sorted(frames)]
+
+    def export_frame_csv(self, path):
+        """
+        One row per frame: wall time, summed time per traced method,
+        datablock counts at the end of the frame and peak RSS. Rows follow
+        the next_frame() calls, see Tracer for auto_frames.
+        """
+        frames = self.frame_summary()
+        names = sorted({name for frame in frames for name in frame['totals']})
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame', 'wall_time'] + names
+                            + list(DATABLOCKS) + ['rss_max_mb'])
+            for frame in frames:
+                writer.writerow(
+                    [frame['frame'], f"{frame['end'] - frame['start']:.6f}"]
+                    + [f"{frame['totals'].get(name, 0.0):.6f}" for name in names]
+                    + [frame.get(name, '') for name in DATABLOCKS]
+                    + [f"{frame['rss_max'] / 2 ** 20:.1f}"])
+
+
+_tracer = None
+_originals = {}
+
+
+def enable(tracer=None):
+    """
+    Wrap every public method of the traced classes. Until then (and after
+    disable) the classes are untouched, so tracing costs nothing when off.
+    """
+    global _tracer
+    if _tracer is not None:
+        disable()
+    _tracer = tracer or Tracer()
+    for cls in TRACED_CLASSES:
+        for attr, fn in list(vars(cls).items()):
+            if attr.startswith('_') or not callable(fn):
+                continue
+            _originals[(cls, attr)] = fn
+            setattr(cls, attr, _tracer.wrap(f'{cls.__name__}.{attr}', fn))
+    return _tracer
+
+
+def disable():
+    global _tracer
+    for (cls, attr), fn in _originals.items():
+        setattr(cls, attr, fn)
+    _originals.clear()
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer():
+    return _tracer
@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import socket
+import hashlib
+import threading
+import traceback
+from .scheduler import item_key
+
+
+SHARED_QUEUE = 'shared'
+
+
+def default_node():
+    return f'{socket.gethostname().split(".")[0]}-{os.getpid()}'
+
+
+def _check_node(node):
+    # Node names are part of file names split on '.'
+    if '.' in node or os.sep in node or node == SHARED_QUEUE:
+        raise ValueError(f'Invalid node name {node}')
+    return node
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _listdir(path):
+    try:
+        return sorted(name for name in os.listdir(path)
+                      if name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+
+
+class Lease:
+    """
+    An item claimed by one node. The lease file's mtime is its heartbeat;
+    lost is set once another node has taken the item over.
+    """
+    def __init__(self, path, item_id, attempt, node, item):
+        self.path = path
+        self.item_id = item_id
+        self.attempt = attempt
+        self.node = node
+        self.item = item
+        self.start = time.time()
+        self.lost = False
+
+    def heartbeat(self):
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            self.lost = True
+        return not self.lost
+
+
+class FileWorkQueue:
+    """
+    Work queue shared between nodes through a common directory (e.g. an
+    NFS mount), with no broker. Items are files that move between
+
+        pending/<queue>/<id>.<attempt>.json   queue is 'shared' or a node
+        leased/<id>.<attempt>.<node>.json     mtime refreshed by heartbeats
+        done/<id>.json, failed/<id>.json
+
+    and every move is an atomic rename, so exactly one node wins a claim.
+    Nodes take from their own queue, then the shared one, then steal from
+    the longest queue of another node. Leases whose heartbeat is older than
+    lease_timeout, and items whose processing raised, go back to the shared
+    queue until max_retries is reached. Per-node progress is written to
+    nodes/<node>.json.
+    """
+    def __init__(self, root, lease_timeout=60.0, max_retries=2):
+        self.root = root
+        self.lease_timeout = lease_timeout
+        self.max_retries = max_retries
+        for name in ('pending', 'leased', 'done', 'failed', 'nodes'):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+        os.makedirs(self._queue_dir(SHARED_QUEUE), exist_ok=True)
+        self.last_reap = 0.0
+
+    def _queue_dir(self, queue):
+        return os.path.join(self.root, 'pending', queue)
+
+    def submit(self, items, nodes=None):
+        """
+        Queue items, round robin over the given node queues or into the
+        shared one. Items already queued, leased or finished are skipped.
+        Returns the number queued.
+        """
+        queues = list(nodes) if nodes else [SHARED_QUEUE]
+        for queue in queues:
+            os.makedirs(self._queue_dir(queue), exist_ok=True)
+        known = self._known_ids()
+        count = 0
+        for item in items:
+            item_id = hashlib.sha1(item_key(item).encode()).hexdigest()[:16]
+            if item_id in known:
+                continue
+            known.add(item_id)
+            queue = queues[count % len(queues)]
+            _write_json(os.path.join(self._queue_dir(queue),
+                                     f'{item_id}.0.json'), {'item': item})
+            count += 1
+        return count
+
+    def _known_ids(self):
+        names = _listdir(os.path.join(self.root, 'leased'))
+        names += _listdir(os.path.join(self.root, 'done'))
+        names += _listdir(os.path.join(self.root, 'failed'))
+        for queue in os.listdir(os.path.join(self.root, 'pending')):
+            names += _listdir(self._queue_dir(queue))
+        return {name.split('.', 1)[0] for name in names}
+
+    def _candidates(self, node):
+        own = _listdir(self._queue_dir(node))
+        yield from ((node, name) for name in own)
+        yield from ((SHARED_QUEUE, name)
+                    for name in _listdir(self._queue_dir(SHARED_QUEUE)))
+        # Steal from whoever has the most left
+        others = [(queue, _listdir(self._queue_dir(queue)))
+                  for queue in os.listdir(os.path.join(self.root, 'pending'))
+                  if queue not in (node, SHARED_QUEUE)]
+        others.sort(key=lambda other: len(other[1]), reverse=True)
+        for queue, names in others:
+            # Take from the back, the owner works from the front
+            yield from ((queue, name) for name in reversed(names))
+
+    def claim(self, node):
+        """Lease the next item for node, or None if nothing is pending"""
+        _check_node(node)
+        if time.time() - self.last_reap > self.lease_timeout / 2:
+            self.reap()
+        for queue, name in self._candidates(node):
+            item_id, attempt = name.split('.')[:2]
+            lease_path = os.path.join(self.root, 'leased',
+                                      f'{item_id}.{attempt}.{node}.json')
+            try:
+                os.rename(os.path.join(self._queue_dir(queue), name),
+                          lease_path)
+            except FileNotFoundError:
+                # Another node was faster
+                continue
+            os.utime(lease_path)
+            item = _read_json(lease_path)['item']
+            return Lease(lease_path, item_id, int(attempt), node, item)
+        return None
+
+    def _finish(self, lease, status, record):
+        path = os.path.join(self.root, status, f'{lease.item_id}.json')
+        try:
+            os.rename(lease.path, path)
+        except FileNotFoundError:
+            lease.lost = True
+            return False
+        record.update(item=lease.item, node=lease.node,
+                      attempts=lease.attempt + 1,
+                      seconds=time.time() - lease.start)
+        _write_json(path, record)
+        return True
+
+    def _requeue(self, lease_path, item_id, attempt):
+        if attempt >= self.max_retries:
+            return 'failed'
+        os.rename(lease_path, os.path.join(self._queue_dir(SHARED_QUEUE),
+                                           f'{item_id}.{attempt + 1}.json'))
+        return 'requeued'
+
+    def complete(self, lease, result=None):
+        """Returns False if the lease was lost to another node meanwhile"""
+        return self._finish(lease, 'done', {'status': 'done', 'result': result})
+
+    def fail(self, lease, error=None):
+        """
+        Put a lease whose processing raised back in the shared queue, or
+        into failed/ after max_retries. Returns 'requeued', 'failed' or
+        'lost'.
+        """
+        try:
+            status = self._requeue(lease.path, lease.item_id, lease.attempt)
+        except FileNotFoundError:
+            lease.lost = True
+            return 'lost'
+        if status == 'failed':
+            if not self._finish(lease, 'failed',
+                                {'status': 'failed', 'error': error}):
+                return 'lost'
+        return status
+
+    def reap(self):
+        """Re-lease items whose heartbeat is older than lease_timeout"""
+        self.last_reap = time.time()
+        leased = os.path.join(self.root, 'leased')
+        reaped = 0
+        for name in _listdir(leased):
+            path = os.path.join(leased, name)
+            try:
+                if time.time() - os.stat(path).st_mtime < self.lease_timeout:
+                    continue
+                item_id, attempt = name.split('.')[:2]
+                if self._requeue(path, item_id, int(attempt)) == 'failed':
+                    record = {'status': 'failed', 'error': 'lease expired',
+                              'node': name.split('.')[2],
+                              'attempts': int(attempt) + 1}
+                    failed_path = os.path.join(self.root, 'failed',
+                                               f'{item_id}.json')
+                    os.rename(path, failed_path)
+                    record['item'] = _read_json(failed_path)['item']
+                    _write_json(failed_path, record)
+            except FileNotFoundError:
+                # Finished or reaped by someone else meanwhile
+                continue
+            reaped += 1
+        return reaped
+
+    def counts(self):
+        pending = sum(len(_listdir(self._queue_dir(queue)))
+                      for queue in os.listdir(os.path.join(self.root, 'pending')))
+        return {'pending': pending,
+                'leased': len(_listdir(os.path.join(self.root, 'leased'))),
+                'done': len(_listdir(os.path.join(self.root, 'done'))),
+                'failed': len(_listdir(os.path.join(self.root, 'failed')))}
+
+    def finished(self):
+        counts = self.counts()
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+    def _write_stats(self, node, stats):
+        stats['updated'] = time.time()
+        elapsed = stats['updated'] - stats['started']
+        stats['items_per_second'] = stats['done'] / elapsed if elapsed else 0.0
+        _write_json(os.path.join(self.root, 'nodes', f'{node}.json'), stats)
+
+    def run(self, fn, node=None, heartbeat=None, poll=1.0, wait=True):
+        """
+        Process items as node with fn(item) -> result until the queue is
+        finished (or, without wait, until nothing is pending). A background
+        thread refreshes the current lease every heartbeat seconds (default
+        lease_timeout / 4). Returns the node's stats.
+        """
+        node = _check_node(node or default_node())
+        os.makedirs(self._queue_dir(node), exist_ok=True)
+        heartbeat = heartbeat or self.lease_timeout / 4
+        stats = {'node': node, 'done': 0, 'failed': 0, 'requeued': 0,
+                 'lost': 0, 'busy_seconds': 0.0, 'started': time.time()}
+        current = {'lease': None}
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(heartbeat):
+                lease = current['lease']
+                if lease is not None:
+                    lease.heartbeat()
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        try:
+            while True:
+                lease = self.claim(node)
+                if lease is None:
+                    if not wait or self.finished():
+                        break
+                    time.sleep(poll)
+                    continue
+
+                current['lease'] = lease
+                try:
+                    result = fn(lease.item)
+                except Exception:
+                    status = self.fail(lease, traceback.format_exc())
+                else:
+                    status = 'done' if self.complete(lease, result) else 'lost'
+                current['lease'] = None
+                stats[status] += 1
+                stats['busy_seconds'] += time.time() - lease.start
+                self._write_stats(node, stats)
+        finally:
+            stop.set()
+            beater.join()
+            self._write_stats(node, stats)
+        return stats
+
+    def summary(self):
+        """Queue counts plus every node's progress and throughput"""
+        summary = self.counts()
+        nodes_dir = os.path.join(self.root, 'nodes')
+        summary['nodes'] = {}
+        for name in _listdir(nodes_dir):
+            try:
+                stats = _read_json(os.path.join(nodes_dir, name))
+            except (FileNotFoundError, ValueError):
+                continue
+            summary['nodes'][stats['node']] = stats
+        return summary
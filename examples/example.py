@@ -4,29 +4,22 @@ import glob
 import math
 import blender_wormholes as bl
 
+# Declared once; applying it again to an unchanged material is a no-op
+WIREFRAME = bl.core.MaterialTemplate(
+    'wireframe',
+    nodes={'wireframe': 'ShaderNodeWireframe',
+           'mix_shader': 'ShaderNodeMixShader'},
+    #Changing bsdf propoerties: subsurface, metallic, specular, roughness
+    inputs={'Principled BSDF': {1: 0, 6: 0.4, 7: 0.0, 9: 0.9},
+            'wireframe': {0: 0.1}},
+    properties={'wireframe': {'use_pixel_size': True}},
+    links=[('Principled BSDF', 0, 'mix_shader', 1),
+           ('wireframe', 0, 'mix_shader', 2),
+           ('mix_shader', 0, 'Material Output', 0)])
+
+
 def create_wireframe_shaders(material):
-    shader = bl.core.Shaders(material)
-    wire = shader.get_node('wireframe')
-    mix_shader = shader.get_node('mix_shader')
-    bsdf = shader.get_node('Principled BSDF')
-    mat_out = shader.get_node('Material Output')
-
-    #Changing bsdf propoerties
-    subsurface = bsdf.inputs[1]
-    metallic = bsdf.inputs[6]
-    specular = bsdf.inputs[7]
-    roughness = bsdf.inputs[9]
-
-    subsurface.default_value = 0
-    metallic.default_value = 0.4
-    specular.default_value = 0.0
-    roughness.default_value = 0.9
-
-    wire.use_pixel_size = True
-    wire.inputs[0].default_value = 0.1
-    shader.links.new(bsdf.outputs[0], mix_shader.inputs[1])
-    shader.links.new(wire.outputs[0], mix_shader.inputs[2])
-    shader.links.new(mix_shader.outputs[0], mat_out.inputs[0])
+    return WIREFRAME.apply(material)
 
 
 def rendering_360_patch_single(sc, obj_name, animation = False):
@@ -37,8 +30,7 @@ def rendering_360_patch_single(sc, obj_name, animation = False):
 
     obj = bl.core.Object(obj_name)
     obj.visibility(hide=False)
-    sc.select_object(obj_name)
-    bpy.ops.object.shade_flat()
+    obj.shade_flat()
 
     if animation:
         obj.add_keyframe('rotation_euler', 0)
@@ -7,29 +7,26 @@ from natsort import natsorted
 import numpy as np
 
 
-def create_wireframe_shaders(material):
-    shader = bl.core.Shaders(material)
-    wire = shader.get_node('wireframe')
-    mix_shader = shader.get_node('mix_shader')
-    bsdf = shader.get_node('Principled BSDF')
-    mat_out = shader.get_node('Material Output')
+# Declared once; applying it again to an unchanged material is a no-op
+WIREFRAME = bl.core.MaterialTemplate(
+    'wireframe',
+    nodes={'wireframe': 'ShaderNodeWireframe',
+           'mix_shader': 'ShaderNodeMixShader'},
+    #Changing bsdf propoerties: subsurface, metallic, specular, roughness
+    inputs={'Principled BSDF': {1: 0, 6: 0.4, 7: 0.0, 9: 0.7},
+            'wireframe': {0: 0.1}},
+    properties={'wireframe': {'use_pixel_size': True}},
+    links=[('Principled BSDF', 0, 'mix_shader', 1),
+           ('wireframe', 0, 'mix_shader', 2),
+           ('mix_shader', 0, 'Material Output', 0)])
 
-    #Changing bsdf propoerties
-    subsurface = bsdf.inputs[1]
-    metallic = bsdf.inputs[6]
-    specular = bsdf.inputs[7]
-    roughness = bsdf.inputs[9]
 
-    subsurface.default_value = 0
-    metallic.default_value = 0.4
-    specular.default_value = 0.0
-    roughness.default_value = 0.7
+def create_wireframe_shaders(material):
+    return WIREFRAME.apply(material)
+
 
-    wire.use_pixel_size = True
-    wire.inputs[0].default_value = 0.1
-    shader.links.new(bsdf.outputs[0], mix_shader.inputs[1])
-    shader.links.new(wire.outputs[0], mix_shader.inputs[2])
-    shader.links.new(mix_shader.outputs[0], mat_out.inputs[0])
+# Reuses loaded textures across iterations instead of reloading each time
+IMAGE_CACHE = bl.image_cache.ImageCache(max_count=64)
 
 
 def change_texture_map(obj, material, tex_path):
@@ -40,7 +37,7 @@ def change_texture_map(obj, material, tex_path):
     #Changing bsdf propoerties
     link = shader.links.new(img_tex.outputs[0], bsdf.inputs[0])
     obj.link_material(shader.mat)
-    img_tex.image = bpy.data.images.load(tex_path)
+    img_tex.image = IMAGE_CACHE.get(tex_path)
     return shader
 
 def rendering_360_patch_dynamic_patch(sc, root_path, obj_paths):
@@ -64,8 +61,7 @@ def rendering_360_patch_dynamic_patch(sc, root_path, obj_paths):
         obj.rotate(math.radians(EULER_ROTATION), 0)
         obj.translate(LOCATION)
         obj.visibility(hide=False)
-        sc.select_object(obj.name)
-        bpy.ops.object.shade_flat()
+        obj.shade_flat()
 
         angle = counter + 0.5*counter
         obj.rotate(math.radians(angle), 2)
@@ -80,6 +76,33 @@ def rendering_360_patch_dynamic_patch(sc, root_path, obj_paths):
         if counter > 250:
                 break
 
+def rendering_360_patch_dynamic_reuse(sc, root_path, obj_paths):
+    # Same as rendering_360_patch_dynamic_patch for patches sharing one
+    # topology: a single object is kept and only its geometry is replaced
+    SCALE = 3.0
+    EULER_ROTATION = 90
+    LOCATION = (-4.26, -14.42, 3.84)
+
+    obj = sc.add_objects(obj_paths[0])
+    scene_materials = bl.utility.get_materials_in_scene()
+    for material in scene_materials:
+        if 'material' in material:
+            create_wireframe_shaders(material)
+
+    obj.scale((SCALE, SCALE, SCALE))
+    obj.rotate(math.radians(EULER_ROTATION), 0)
+    obj.translate(LOCATION)
+    obj.visibility(hide=False)
+    obj.shade_flat()
+
+    for counter, obj_path in enumerate(obj_paths[:251]):
+        obj.update_geometry(obj_path)
+        angle = counter + 0.5*counter
+        obj.rotate(math.radians(angle), 2)
+        out_path = os.path.join(root_path, f'{counter}.png')
+        sc.render(path = out_path, animation=False)
+    sc.delete_objects(obj.name)
+
 def rendering_360_patch_dynamic_conformal(sc, root_path, obj_paths, check = False):
     scene_materials = bl.utility.get_materials_in_scene()
     for material in scene_materials:
@@ -105,8 +128,7 @@ def rendering_360_patch_dynamic_conformal(sc, root_path, obj_paths, check = Fals
         shader = change_texture_map(obj, material, tex_path)
         obj.link_material(shader.mat)
         obj.visibility(hide=False)
-        sc.select_object(obj.name)
-        bpy.ops.object.shade_flat()
+        obj.shade_flat()
 
 
         # TODO Change the camera angle rather than the object
@@ -125,37 +147,28 @@ def rendering_360_patch_dynamic_conformal(sc, root_path, obj_paths, check = Fals
                 break
 
 def render_point_cloud(sc, root_path, ply_paths):
-    counter = 0
     scale = 3.0
     angle = 90
     location = (-2.26, -10.42, 3.84)
 
-    node_group = bpy.data.objects['dummy'].modifiers[-1].node_group
+    # One object for the whole sequence, only its points are replaced
+    cloud = bl.core.PointCloud('point_cloud', radius=0.005)
+    cloud.scale((scale, scale, scale))
+    cloud.rotate(math.radians(angle), 0)
+    cloud.translate(location)
+    cloud.visibility(hide=False)
 
-    for ply_path in ply_paths:
+    for counter, ply_path in enumerate(ply_paths[:251]):
         name = ply_path.split('/')[-2].split('_')[0]
         ply_path = f"/home/cvit/shan/differentiable_parameterization/src/output/reconstructed_pc/bob_ppt/train/{name}_combined_pc.ply"
-        obj = sc.add_objects(ply_path)
-        bpy.ops.object.modifier_add(type='NODES')
-        obj.scale((scale, scale, scale))
-        obj.rotate(math.radians(angle), 0)
-        obj.translate(location)
-        obj.visibility(hide=False)
-        sc.select_object(obj.name)
-        obj.obj.modifiers[-1].node_group = node_group
-        bpy.ops.object.shade_flat()
+        cloud.load(ply_path)
         angle = counter + 0.5*counter
-        obj.rotate(math.radians(angle), 2)
+        cloud.rotate(math.radians(angle), 2)
 
         out_path = os.path.join(root_path, f'{counter}.png')
         sc.render(path = out_path, animation=False)
-        obj.visibility(hide=True)
-        counter +=1
         #  bpy.ops.wm.save_as_mainfile(filepath='/home/cvit/coreqode/visualization/SIGG_video/test.blend')
-        sc.delete_objects(obj.name)
-        del obj
-        if counter > 250:
-                break
+    sc.delete_objects(cloud.name)
 
 def main():
     sc = bl.core.Scene()
@@ -0,0 +1,44 @@
+import os
+import glob
+import math
+import blender_wormholes as bl
+from natsort import natsorted
+
+
+SCALE = 3.0
+EULER_ROTATION = 90
+LOCATION = (-4.26, -14.42, 3.84)
+
+
+def render_patch(sc, item):
+    # Runs inside each headless Blender worker
+    obj = sc.add_objects(item['obj_path'])
+    obj.scale((SCALE, SCALE, SCALE))
+    obj.rotate(math.radians(EULER_ROTATION), 0)
+    obj.translate(LOCATION)
+    obj.rotate(math.radians(1.5 * item['counter']), 2)
+    sc.render(path=item['out_path'], animation=False)
+    sc.delete_objects(obj.name)
+    return item['out_path']
+
+
+def main():
+    mesh_name = 'spot_patches'
+    root_path = f'./render/{mesh_name}/patch_pred'
+    os.makedirs(root_path, exist_ok=True)
+
+    obj_paths = natsorted(glob.glob(f'./files/{mesh_name}/*.obj'))
+    items = [{'obj_path': obj_path,
+              'counter': counter,
+              'out_path': os.path.join(root_path, f'{counter}.png')}
+             for counter, obj_path in enumerate(obj_paths)]
+
+    scheduler = bl.scheduler.RenderScheduler(
+        './files/scene.blend', f'{os.path.abspath(__file__)}:render_patch',
+        workers=16, threads=4,
+        manifest_path=os.path.join(root_path, 'manifest.jsonl'))
+    print(scheduler.run(items))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import time
+import pytest
+from blender_wormholes.pipeline import OutputPipeline
+
+
+class SlowCallbackPipeline(OutputPipeline):
+    # Widens the gap between a task finishing and its done callback
+    def _done(self, future):
+        time.sleep(0.2)
+        super()._done(future)
+
+
+def _fail():
+    # Still running when submit() attaches the done callback
+    time.sleep(0.05)
+    raise ValueError('write failed')
+
+
+def test_close_raises_task_error():
+    pipeline = SlowCallbackPipeline(workers=1)
+    pipeline.submit(_fail)
+    with pytest.raises(ValueError, match='write failed'):
+        pipeline.close()
+
+
+def test_error_is_raised_once():
+    pipeline = SlowCallbackPipeline(workers=1)
+    pipeline.submit(_fail)
+    with pytest.raises(ValueError):
+        pipeline.flush()
+    time.sleep(0.3)
+    pipeline.close()
+
+
+def test_submit_blocks_at_max_pending():
+    pipeline = OutputPipeline(workers=1, max_pending=2)
+    results = [pipeline.submit(time.sleep, 0.05) for _ in range(4)]
+    assert pipeline.pending() <= 2
+    pipeline.close()
+    assert all(future.done() for future in results)
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import multiprocessing as mp
+import pytest
+from blender_wormholes.workqueue import FileWorkQueue
+
+if 'fork' not in mp.get_all_start_methods():
+    pytest.skip('needs fork to start worker processes',
+                allow_module_level=True)
+
+ctx = mp.get_context('fork')
+
+
+def _record(root, node):
+    def process(item):
+        # One line per processed item, to spot anything run twice
+        with open(os.path.join(root, f'ran-{node}.txt'), 'a') as f:
+            f.write(f'{item}\n')
+        if node == 'slow':
+            time.sleep(0.01)
+        return item * 2
+    return process
+
+
+def _run_worker(root, node, lease_timeout):
+    queue = FileWorkQueue(root, lease_timeout=lease_timeout)
+    queue.run(_record(root, node), node=node, poll=0.05)
+
+
+def _claim_and_crash(root, node):
+    FileWorkQueue(root, lease_timeout=0.5).claim(node)
+    os._exit(1)
+
+
+def _always_fail(item):
+    raise RuntimeError(f'cannot process {item}')
+
+
+def _start(target, *args):
+    process = ctx.Process(target=target, args=args)
+    process.start()
+    return process
+
+
+def _join(processes, timeout=60):
+    for process in processes:
+        process.join(timeout)
+        assert not process.is_alive()
+
+
+def _ran(root):
+    ran = {}
+    for name in os.listdir(root):
+        if name.startswith('ran-'):
+            with open(os.path.join(root, name)) as f:
+                ran[name[4:-4]] = [int(line) for line in f]
+    return ran
+
+
+def _records(root, status):
+    directory = os.path.join(root, status)
+    records = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name)) as f:
+            records.append(json.load(f))
+    return records
+
+
+def test_every_item_runs_once_across_processes(tmp_path):
+    root = str(tmp_path)
+    queue = FileWorkQueue(root, lease_timeout=5.0)
+    # 'idle' has no worker and fast2/fast3 no queue, so a third of the
+    # items only finish by being stolen
+    assert queue.submit(range(200), nodes=['fast', 'slow', 'idle']) == 200
+    assert queue.submit(range(200)) == 0
+
+    nodes = ['fast', 'slow', 'fast2', 'fast3']
+    _join([_start(_run_worker, root, node, 5.0) for node in nodes])
+
+    ran = _ran(root)
+    items = [item for node_items in ran.values() for item in node_items]
+    assert sorted(items) == list(range(200))
+    assert queue.counts() == {'pending': 0, 'leased': 0, 'done': 200,
+                              'failed': 0}
+
+    summary = queue.summary()
+    assert set(summary['nodes']) == set(nodes)
+    assert sum(stats['done'] for stats in summary['nodes'].values()) == 200
+    assert all(stats['lost'] == 0 for stats in summary['nodes'].values())
+
+
+def test_expired_lease_is_released(tmp_path):
+    root = str(tmp_path)
+    queue = FileWorkQueue(root, lease_timeout=0.5)
+    queue.submit([7])
+
+    crasher = _start(_claim_and_crash, root, 'crasher')
+    _join([crasher])
+    assert crasher.exitcode == 1
+    assert queue.counts()['leased'] == 1
+    # Not expired yet, so nobody else may take it
+    assert queue.claim('other') is None
+
+    time.sleep(0.6)
+    _join([_start(_run_worker, root, 'rescuer', 0.5)])
+    assert _ran(root) == {'rescuer': [7]}
+    record = _records(root, 'done')[0]
+    assert record['node'] == 'rescuer'
+    assert record['attempts'] == 2
+    assert record['result'] == 14
+
+
+def test_lost_lease_cannot_complete(tmp_path):
+    queue = FileWorkQueue(str(tmp_path), lease_timeout=0.2)
+    queue.submit(['a'])
+    lease = queue.claim('one')
+    time.sleep(0.3)
+    assert queue.reap() == 1
+    other = queue.claim('two')
+    assert other.item == 'a' and other.attempt == 1
+
+    assert not queue.complete(lease)
+    assert lease.lost and not lease.heartbeat()
+    assert queue.complete(other, 'ok')
+
+
+def test_failing_item_stops_after_max_retries(tmp_path):
+    queue = FileWorkQueue(str(tmp_path), max_retries=2)
+    queue.submit(['bad', 'good'])
+    stats = queue.run(lambda item: _always_fail(item) if item == 'bad'
+                      else item, node='solo', poll=0.05)
+
+    assert stats['done'] == 1
+    assert stats['requeued'] == 2
+    assert stats['failed'] == 1
+    assert queue.counts() == {'pending': 0, 'leased': 0, 'done': 1,
+                              'failed': 1}
+    record = _records(str(tmp_path), 'failed')[0]
+    assert record['item'] == 'bad' and record['attempts'] == 3
+    assert 'cannot process bad' in record['error']
+
+
+def test_expired_leases_stop_after_max_retries(tmp_path):
+    root = str(tmp_path)
+    queue = FileWorkQueue(root, lease_timeout=0.5, max_retries=1)
+    queue.submit([1])
+    for _ in range(2):
+        _join([_start(_claim_and_crash, root, 'crasher')])
+        time.sleep(0.6)
+        queue.reap()
+    assert queue.counts() == {'pending': 0, 'leased': 0, 'done': 0,
+                              'failed': 1}
+    record = _records(root, 'failed')[0]
+    assert record['error'] == 'lease expired'
+    assert record['item'] == 1 and record['attempts'] == 2